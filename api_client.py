@@ -1,38 +1,268 @@
 """
 API Client - Fetches moon phase data from RapidAPI
 """
-import urequests
 import json
+import os
+import socket
+import time
+
+from moon_calc import PHASE_NAMES
+
+try:
+    import ssl
+except ImportError:
+    import ussl as ssl  # Older MicroPython builds
+
+API_HOST = "moon-phase.p.rapidapi.com"
+CACHE_FILE = "/moon_cache.json"
+CACHE_TTL = 1800  # Seconds a cached response stays valid (30 minutes)
+SOCKET_TIMEOUT = 10  # Seconds a connect/read may stall before it fails
+
+# Bodies larger than this are key-scanned instead of fully decoded
+FAST_PARSE_THRESHOLD = 4096
+
+# Top-level keys _parse_response actually reads
+_WANTED_KEYS = (b'phase', b'distance', b'angular_diameter', b'moonrise',
+                b'moonset', b'transit', b'zodiac')
+
+def _json_loads(content):
+    """
+    json.loads for a response body, which may be a memoryview of the pooled
+    receive buffer. MicroPython parses that in place; CPython only takes
+    str/bytes, so it gets a copy there.
+    """
+    try:
+        return json.loads(content)
+    except TypeError:
+        return json.loads(bytes(content))
+
+class Response:
+    """HTTP response returned by KeepAliveSession (mimics the urequests API)"""
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+    
+    def json(self):
+        return _json_loads(self.content)
+    
+    def close(self):
+        # Nothing to release - the socket stays open for the next request
+        pass
+
+class KeepAliveSession:
+    """
+    Minimal HTTP/1.1 client that keeps one TLS connection open between requests.
+    urequests opens a new socket for every call, so each request pays for a
+    full TCP + TLS handshake. Here only the first request does.
+    """
+    def __init__(self, host, port=443, timeout=SOCKET_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+    
+    def _ensure_session(self):
+        """Open the TLS connection if we don't already have one"""
+        if self.sock is not None:
+            return
+        addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        try:
+            # Without a timeout a silently dropped connection (e.g. an expired
+            # NAT mapping after a day idle) blocks the first read forever;
+            # with one it raises OSError and get() retries on a fresh socket
+            sock.settimeout(self.timeout)
+            sock.connect(addr)
+            self.sock = ssl.wrap_socket(sock, server_hostname=self.host)
+        except OSError:
+            sock.close()
+            raise
+    
+    def get(self, path, headers, buf=None):
+        """
+        Send a GET request over the shared connection
+        Reconnects once if the server has closed the idle connection.
+        If buf (a bytearray) is given and the body fits, the body is read into
+        it and Response.content is a memoryview of buf, valid until buf is
+        reused by the next request.
+        Returns: Response
+        """
+        reused = self.sock is not None
+        self._ensure_session()
+        try:
+            return self._request(path, headers, buf)
+        except OSError:
+            self.close()
+            if not reused:
+                raise
+        # The old connection was stale - retry once on a fresh one
+        self._ensure_session()
+        try:
+            return self._request(path, headers, buf)
+        except OSError:
+            self.close()
+            raise
+    
+    def close(self):
+        """Close the connection (it will be reopened on the next request)"""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+    
+    def _request(self, path, headers, buf):
+        sock = self.sock
+        request = f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n"
+        for name, value in headers.items():
+            request += f"{name}: {value}\r\n"
+        sock.write((request + "\r\n").encode())
+        
+        # Status line, e.g. b"HTTP/1.1 200 OK"
+        status_line = sock.readline()
+        if not status_line:
+            raise OSError("Connection closed by server")
+        status_code = int(status_line.split(None, 2)[1])
+        
+        # Headers (names lowercased for easy lookup)
+        resp_headers = {}
+        while True:
+            line = sock.readline()
+            if not line or line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+        
+        # Body - we need its exact length to leave the socket usable afterwards
+        if status_code in (204, 304):
+            content = b""
+        elif resp_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = self._read_chunked()
+        elif 'content-length' in resp_headers:
+            content = self._read_exact(int(resp_headers['content-length']), buf)
+        else:
+            # No length given: the server closes the connection to end the body
+            content = sock.read()
+            resp_headers['connection'] = 'close'
+        
+        if resp_headers.get('connection', '').lower() == 'close':
+            self.close()
+        
+        return Response(status_code, resp_headers, content)
+    
+    def _read_exact(self, length, buf=None):
+        """
+        Read exactly length bytes from the socket
+        Reads into buf when it is big enough, otherwise into a new bytearray.
+        """
+        if buf is not None and length <= len(buf):
+            result = memoryview(buf)[:length]
+            view = result
+        else:
+            result = bytearray(length)
+            view = memoryview(result)
+        received = 0
+        while received < length:
+            n = self.sock.readinto(view[received:])
+            if not n:
+                raise OSError("Connection closed mid-response")
+            received += n
+        return result
+    
+    def _read_chunked(self):
+        """Read a body sent with Transfer-Encoding: chunked"""
+        body = bytearray()
+        while True:
+            size = int(self.sock.readline().split(b";")[0].strip(), 16)
+            if size == 0:
+                # Skip optional trailers up to the final blank line
+                while self.sock.readline() not in (b"\r\n", b""):
+                    pass
+                break
+            body.extend(self._read_exact(size))
+            self.sock.readline()  # CRLF after each chunk
+        return body
 
 class MoonAPIClient:
-    def __init__(self, api_key, api_host, latitude, longitude):
+    def __init__(self, api_key, api_host, latitude, longitude, mode='advanced', debug=False):
+        """
+        mode: 'advanced' for the full payload (distance, zodiac, ...) or
+              'basic' for the much smaller phase/illumination/age/rise/set view
+        debug: print progress messages (errors are always printed)
+        """
         self.api_key = api_key
         self.api_host = api_host
         self.latitude = latitude
         self.longitude = longitude
-        self.base_url = "https://moon-phase.p.rapidapi.com/advanced"
+        self.mode = mode
+        self.base_path = f"/{mode}"
+        self._session = KeepAliveSession(API_HOST)
+        # Reusable receive buffer so each response doesn't allocate its own
+        self._recv = bytearray(4096)
+        self._cache_path = CACHE_FILE
+        self._ttl = CACHE_TTL
+        self.debug = debug
     
     def get_moon_data(self):
         """
         Fetch moon phase data from RapidAPI
+        Returns cached data if a recent response exists for this location.
+        Older cached data is revalidated with a conditional request, so an
+        unchanged result costs a 304 instead of a full download.
         Returns: dict with moon data or None if failed
         """
-        url = f"{self.base_url}?lat={self.latitude}&lon={self.longitude}"
+        entry = self._load_cache()
+        # A negative age means the clock is behind the cache (e.g. not yet
+        # NTP synced after a reset), so freshness can't be trusted
+        if entry is not None and 0 <= time.time() - entry.get('ts', 0) < self._ttl:
+            if self.debug:
+                print("Using cached moon data")
+            return entry.get('data')
+        
+        path = f"{self.base_path}?lat={self.latitude}&lon={self.longitude}"
         
         headers = {
             'x-rapidapi-host': self.api_host,
             'x-rapidapi-key': self.api_key
         }
         
+        # Ask the server to skip the body if nothing changed since last time
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
         try:
-            print(f"Fetching moon data from API...")
-            response = urequests.get(url, headers=headers)
+            if self.debug:
+                print("Fetching moon data from API...")
+            response = self._session.get(path, headers, self._recv)
             
-            if response.status_code == 200:
-                data = response.json()
+            if response.status_code == 304 and entry is not None:
+                response.close()
+                if self.debug:
+                    print("API data unchanged (304)")
+                moon_data = entry.get('data')
+                self._save_cache(moon_data, entry.get('etag'), entry.get('last_modified'))
+                return moon_data
+            elif response.status_code == 200:
+                content = response.content
                 response.close()
-                print("API call successful")
-                return self._parse_response(data)
+                if self.debug:
+                    print("API call successful")
+                if len(content) > FAST_PARSE_THRESHOLD:
+                    moon_data = self._parse_response_fast(content)
+                else:
+                    moon_data = self._parse_response(_json_loads(content))
+                if moon_data:
+                    self._save_cache(
+                        moon_data,
+                        response.headers.get('etag'),
+                        response.headers.get('last-modified')
+                    )
+                return moon_data
             else:
                 print(f"API error: {response.status_code}")
                 response.close()
@@ -40,19 +270,67 @@ class MoonAPIClient:
                 
         except Exception as e:
             print(f"API request failed: {e}")
+            # Drop the connection so the next call starts from a clean socket
+            self._session.close()
+            return None
+    
+    def close(self):
+        """Close the persistent API connection"""
+        self._session.close()
+    
+    def _load_cache(self):
+        """
+        Load the cached API response from flash
+        Returns: cache entry dict (ts, etag, last_modified, data), or None if
+        missing or for another location/mode
+        """
+        try:
+            with open(self._cache_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            # No cache yet or it is corrupted
+            return None
+        
+        if entry.get('lat') != self.latitude or entry.get('lon') != self.longitude:
+            return None
+        if entry.get('mode') != self.mode:
             return None
+        return entry
+    
+    def _save_cache(self, moon_data, etag=None, last_modified=None):
+        """Write parsed moon data to flash (temp file + rename so it is never half-written)"""
+        entry = {
+            'ts': time.time(),
+            'lat': self.latitude,
+            'lon': self.longitude,
+            'mode': self.mode,
+            'etag': etag,
+            'last_modified': last_modified,
+            'data': moon_data,
+        }
+        tmp_path = self._cache_path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.rename(tmp_path, self._cache_path)
+        except OSError as e:
+            print(f"Error saving API cache: {e}")
     
     def _parse_response(self, data):
         """
         Parse API response and extract relevant moon data
+        Phase fields missing from the payload (the 'basic' view may not have
+        them all) are None, so compare_with_api can skip them rather than
+        compare against a made-up 0. Other fields fall back to their defaults.
         Returns: dict with standardized moon information
         """
         try:
             # Extract key moon phase information
+            phase = data.get('phase', {})
             moon_data = {
-                'phase_name': data.get('phase', {}).get('phase', 'Unknown'),
-                'illumination': data.get('phase', {}).get('illumination', 0),
-                'age_days': data.get('phase', {}).get('age', 0),
+                'phase_name': phase.get('phase'),
+                'illumination': phase.get('illumination'),
+                'age_days': phase.get('age'),
                 'distance_km': data.get('distance', {}).get('km', 0),
                 'angular_diameter': data.get('angular_diameter', {}).get('degrees', 0),
                 'moonrise': data.get('moonrise', 'N/A'),
@@ -61,12 +339,100 @@ class MoonAPIClient:
                 'zodiac': data.get('zodiac', {}).get('sign', 'Unknown'),
             }
             
+            if not phase:
+                print(f"API response has no phase data (mode '{self.mode}')")
+            
+            # Small integer id for the phase so callers can index tables
+            try:
+                moon_data['phase_index'] = PHASE_NAMES.index(moon_data['phase_name'])
+            except ValueError:  # Unknown or missing name
+                moon_data['phase_index'] = -1
+            
             return moon_data
             
         except Exception as e:
             print(f"Error parsing API response: {e}")
             return None
     
+    def _parse_response_fast(self, raw):
+        """
+        Parse a large API response by decoding only the values we need
+        json.loads on the whole body builds every nested dict just to throw
+        most of them away. Instead, walk the top-level keys in the raw bytes,
+        skipping over each value and decoding only the wanted ones. Falls
+        back to a full decode if the scan fails.
+        Returns: dict with standardized moon information
+        """
+        if not isinstance(raw, bytes):
+            raw = bytes(raw)  # bytearray has no find() on MicroPython
+        try:
+            data = {}
+            pos = self._skip_space(raw, raw.index(b'{') + 1)
+            while raw[pos] != 0x7D:  # Until the closing '}'
+                if raw[pos] != 0x22:
+                    raise ValueError("expected a key")
+                key_end = self._value_end(raw, pos)
+                key = raw[pos + 1:key_end - 1]
+                pos = self._skip_space(raw, key_end)
+                if raw[pos] != 0x3A:
+                    raise ValueError("missing ':' after key")
+                start = self._skip_space(raw, pos + 1)
+                end = self._value_end(raw, start)
+                if key in _WANTED_KEYS:
+                    data[key.decode()] = json.loads(raw[start:end])
+                pos = self._skip_space(raw, end)
+                if raw[pos] == 0x2C:  # ',' before the next key
+                    pos = self._skip_space(raw, pos + 1)
+        except (ValueError, IndexError) as e:
+            print(f"Fast parse failed ({e}), decoding full response")
+            data = json.loads(raw)
+        return self._parse_response(data)
+    
+    def _skip_space(self, raw, pos):
+        """Index of the first non-whitespace byte in raw at or after pos"""
+        while raw[pos] in (0x20, 0x09, 0x0D, 0x0A):
+            pos += 1
+        return pos
+    
+    def _value_end(self, raw, start):
+        """
+        Find the end of the JSON value starting at raw[start]
+        Returns: index just past the value
+        """
+        first = raw[start]
+        end = start
+        if first == 0x7B or first == 0x5B:  # Object or array: match brackets
+            depth = 0
+            in_string = False
+            while True:
+                c = raw[end]
+                if in_string:
+                    if c == 0x5C:  # Backslash escapes the next byte
+                        end += 1
+                    elif c == 0x22:
+                        in_string = False
+                elif c == 0x22:
+                    in_string = True
+                elif c == 0x7B or c == 0x5B:
+                    depth += 1
+                elif c == 0x7D or c == 0x5D:
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            end += 1
+        elif first == 0x22:  # String: find the closing quote
+            end += 1
+            while raw[end] != 0x22:
+                if raw[end] == 0x5C:
+                    end += 1
+                end += 1
+            end += 1
+        else:  # Number, true/false/null: runs until the next delimiter
+            while raw[end] not in (0x2C, 0x7D, 0x5D, 0x20, 0x09, 0x0D, 0x0A):
+                end += 1
+        return end
+    
     def test_connection(self):
         """Test API connection and print sample data"""
         print("\n=== Testing API Connection ===")
@@ -1,4 +1,3 @@
-"""
 """Display Manager - Handles Waveshare 4.2" e-Paper display rendering
 Requires Waveshare epd4in2 driver in lib/ directory
 """
@@ -6,30 +5,169 @@ Requires Waveshare epd4in2 driver in lib/ directory
 # Note: This uses Waveshare's V2 MicroPython driver from lib/Pico_ePaper_4_2_V2.py
 # The V2 driver is newer (2023) with improved performance and bug fixes
 
+import sys
+import time
+import framebuf
 import lunar_graphics
+from moon_calc import PHASE_NAMES
+
+# Import Waveshare V2 driver (must be in lib/) once, when this module loads
+if '/lib' not in sys.path:
+    sys.path.append('/lib')  # Ensure lib is in path
+try:
+    from Pico_ePaper_4_2_V2 import EPD_4in2
+    _HAS_DRIVER = True
+    _DRIVER_ERROR = None
+except ImportError as ie:
+    _HAS_DRIVER = False
+    _DRIVER_ERROR = str(ie)
+
+try:
+    import micropython
+except ImportError:
+    micropython = None  # Not running on MicroPython
+
+try:
+    import _thread
+except ImportError:
+    _thread = None  # No threads: draw on the calling core
+
+# Layout positions that never change (8 pixel wide font)
+_TITLE = "Lunar Phase Tracker"
+_TITLE_X = (400 - len(_TITLE) * 8) // 2
+_TIME_X = (220 - len("HH:MM") * 8) // 2  # Time is always 5 characters
+
+# Partial refreshes allowed before a full refresh clears the ghosting
+_FULL_REFRESH_EVERY = 10
+
+# SPI clock for frame transfers (the driver default is 4MHz)
+_SPI_BAUDRATE = 20_000_000
+
+# Centered x position of each phase name in the left area (0-220), by phase_index
+_PHASE_X = tuple((220 - len(name) * 8) // 2 for name in PHASE_NAMES)
+
+# Fallback text symbols, in moon_calc.PHASE_NAMES order (indexed by phase_index)
+_PHASE_SYMBOLS = ("●", ")", "◐", "◑", "○", "◒", "◓", "(")
+
+if _HAS_DRIVER:
+    class _EPD(EPD_4in2):
+        """V2 driver whose wait for the panel can be skipped (see DisplayManager._push_frame)"""
+        defer_busy = False
+        
+        def __init__(self):
+            super().__init__()
+            # The driver sets up SPI at 4MHz; the panel handles 20MHz fine
+            self.spi.init(baudrate=_SPI_BAUDRATE)
+        
+        def ReadBusy(self):
+            if not self.defer_busy:
+                super().ReadBusy()
+        
+        def send_data1(self, buf):
+            # Same framing as the driver, but write buf as-is in one
+            # transaction (the driver copies it into a new bytearray first)
+            self.digital_write(self.dc_pin, 1)
+            self.digital_write(self.cs_pin, 0)
+            self.spi.write(buf)
+            self.digital_write(self.cs_pin, 1)
+
+_blit_mono_hlsb = None
+if micropython is not None:
+    @micropython.viper
+    def _blit_mono_hlsb(dst: ptr8, src: ptr8, dst_stride: int, src_stride: int,
+                        x: int, y: int, w: int, h: int):
+        # OR a MONO_HLSB bitmap (w x h) into a MONO_HLSB buffer at (x, y).
+        # Viper compiles this to native code working on raw byte pointers.
+        # The caller must make sure the bitmap fits inside the destination.
+        shift = x & 7
+        col = x >> 3
+        nbytes = (w + 7) >> 3
+        for dy in range(h):
+            s = dy * src_stride
+            d = (y + dy) * dst_stride + col
+            if shift == 0:
+                for i in range(nbytes):
+                    dst[d + i] = dst[d + i] | src[s + i]
+            else:
+                # Not byte aligned: each source byte straddles two destination bytes
+                carry = 0
+                for i in range(nbytes):
+                    b = int(src[s + i])
+                    dst[d + i] = int(dst[d + i]) | carry | (b >> shift)
+                    carry = (b << (8 - shift)) & 0xFF
+                dst[d + nbytes] = int(dst[d + nbytes]) | carry
 
 class DisplayManager:
-    def __init__(self):
-        """Initialize the e-Paper display"""
+    def __init__(self, debug=False):
+        """
+        Initialize the e-Paper display
+        debug: print progress messages (errors are always printed)
+        """
+        self.debug = debug
         self.width = 400
         self.height = 300
         self.epd = None
         self.initialized = False
         
+        # Our own 400x300 MONO_HLSB frame (15000 bytes), allocated once and
+        # reused for every refresh. For MONO_HLSB: 0x00 = white, 0xff = black
+        self._fb_buf = None
+        self._fb = None
+        # memoryview of _fb_buf handed to the driver, so nothing on the way
+        # to spi.write can copy the frame
+        self._mv = None
+        
+        # Text that never changes (title, labels) is drawn once at init into
+        # this layer, which is then copied in to start every refresh
+        self._labels_buf = None
+        
+        # (timestamp, time.localtime(timestamp)) from the last draw
+        self._last_time_cache = (None, None)
+        
+        # True while the panel may still be refreshing (see wait_idle)
+        self._busy = False
+        # Copy of the frame last sent to the panel (allocated once at init) and
+        # whether it is valid, i.e. a full refresh has happened since init/clear
+        self._prev_buffer = None
+        self._have_prev = False
+        # Partial refreshes since the last full one (see _FULL_REFRESH_EVERY)
+        self._partial_count = 0
+        
+        # Drawing runs on the second core when _thread is available (see
+        # _worker). _job holds the latest draw arguments (a single slot, a
+        # newer frame replaces one not yet drawn) and is guarded by _job_lock.
+        # _wake is held while there is nothing to do.
+        self._job = None
+        self._job_lock = None
+        self._wake = None
+        self._drawing = False
+        
+        if not _HAS_DRIVER:
+            print(f"WARNING: Pico_ePaper_4_2_V2 driver not found: {_DRIVER_ERROR}")
+            print("Running in simulation mode.")
+            print("To use real display, ensure lib/Pico_ePaper_4_2_V2.py exists")
+            return
+        
         try:
-            # Import Waveshare V2 driver (must be in lib/)
-            import sys
-            sys.path.append('/lib')  # Ensure lib is in path
-            from Pico_ePaper_4_2_V2 import EPD_4in2
             # Note: EPD_4in2() initializes automatically in __init__
-            self.epd = EPD_4in2()
+            self.epd = _EPD()
+            self._fb_buf = bytearray(self.width * self.height // 8)
+            self._mv = memoryview(self._fb_buf)
+            self._fb = framebuf.FrameBuffer(self._fb_buf, self.width, self.height,
+                                            framebuf.MONO_HLSB)
+            self._labels_buf = bytearray(len(self._fb_buf))
+            self._prev_buffer = bytearray(len(self._fb_buf))
+            labels_fb = framebuf.FrameBuffer(self._labels_buf, self.width, self.height,
+                                             framebuf.MONO_HLSB)
+            self._draw_static_labels(labels_fb)
             self.initialized = True
             print("Display initialized successfully (V2 driver)")
-        except ImportError as ie:
-            print(f"WARNING: Pico_ePaper_4_2_V2 driver not found: {ie}")
-            print("Running in simulation mode.")
-            print("To use real display, ensure lib/Pico_ePaper_4_2_V2.py exists")
-            self.initialized = False
+            
+            if _thread is not None:
+                self._job_lock = _thread.allocate_lock()
+                self._wake = _thread.allocate_lock()
+                self._wake.acquire()
+                _thread.start_new_thread(self._worker, ())
         except Exception as e:
             print(f"Display initialization error: {e}")
             self.initialized = False
@@ -41,14 +179,20 @@ class DisplayManager:
             return
         
         try:
+            self.wait_drawn()
+            self.wait_idle()
             self.epd.EPD_4IN2_V2_Clear()
-            print("Display cleared")
+            self._have_prev = False
+            if self.debug:
+                print("Display cleared")
         except Exception as e:
             print(f"Error clearing display: {e}")
     
     def draw_moon_data(self, moon_data, location_name, last_update):
         """
         Draw moon phase information on the display
+        With threads available this only queues the frame for the second
+        core and returns straight away.
         
         Args:
             moon_data: dict with moon phase info
@@ -59,86 +203,177 @@ class DisplayManager:
             self._simulate_display(moon_data, location_name, last_update)
             return
         
+        if self._wake is None:
+            self._draw_now(moon_data, location_name, last_update)
+            return
+        
+        with self._job_lock:
+            wake_worker = self._job is None
+            self._job = (moon_data, location_name, last_update)
+        if wake_worker:
+            self._wake.release()
+    
+    def wait_drawn(self):
+        """Block until the second core has drawn and sent every queued frame"""
+        if self._wake is None:
+            return
+        while True:
+            with self._job_lock:
+                if self._job is None and not self._drawing:
+                    return
+            time.sleep_ms(20)
+    
+    def _worker(self):
+        """Second-core loop: draw queued frames (only this core touches SPI meanwhile)"""
+        while True:
+            self._wake.acquire()
+            with self._job_lock:
+                job = self._job
+                self._job = None
+                self._drawing = True
+            if job is not None:
+                self._draw_now(*job)
+            with self._job_lock:
+                self._drawing = False
+    
+    def _draw_now(self, moon_data, location_name, last_update):
+        """Render the frame and send it to the panel (see draw_moon_data)"""
         try:
-            # Use the driver's built-in framebuffer
-            import time
+            # Start from the pre-drawn labels layer (a single memory copy)
+            self._fb_buf[:] = self._labels_buf
+            
+            # Draw content on our framebuffer
+            self._draw_layout(self._fb, moon_data, location_name, last_update,
+                              self._fb_buf)
             
-            # Clear the built-in framebuffer to white
-            # For MONO_HLSB: 0x00 = white, 0xff = black
-            self.epd.image1Gray.fill(0x00)  # Fill with white background
+            # Nothing visible changed (e.g. same minute) - leave the panel alone
+            if self._have_prev and self._fb_buf == self._prev_buffer:
+                if self.debug:
+                    print("Display unchanged, skipping refresh")
+                return
             
-            # Draw content directly on the driver's framebuffer
-            self._draw_layout(self.epd.image1Gray, moon_data, location_name, last_update)
+            # Partial refresh is much quicker, but ghosting builds up, so do
+            # a full refresh first and then every _FULL_REFRESH_EVERY frames
+            partial = (self._have_prev and
+                       self._partial_count < _FULL_REFRESH_EVERY)
             
-            # Send to display using driver's method
-            self.epd.EPD_4IN2_V2_Display(self.epd.buffer_1Gray)
-            print("Display updated successfully")
+            # Send to display; the refresh finishes in the background
+            self._push_frame(partial)
+            self._partial_count = self._partial_count + 1 if partial else 0
+            self._prev_buffer[:] = self._fb_buf
+            self._have_prev = True
+            if self.debug:
+                print("Display partially updated" if partial else "Display updated successfully")
             
         except Exception as e:
             print(f"Error updating display: {e}")
     
-    def _draw_layout(self, fb, moon_data, location_name, last_update):
+    def wait_idle(self):
+        """Block until the panel has finished its last refresh"""
+        if not self.initialized or not self._busy:
+            return
+        # The V2 panel holds BUSY high while refreshing
+        while self.epd.digital_read(self.epd.busy_pin) == 1:
+            time.sleep_ms(20)
+        self._busy = False
+    
+    def _push_frame(self, partial=False):
+        """
+        Send _fb_buf to the panel without waiting for the refresh to finish
+        The driver blocks in ReadBusy() until the panel is done, which takes
+        seconds for a full refresh. We skip that wait here and do it in
+        wait_idle() before the next command goes to the panel instead.
+        """
+        self.wait_idle()
+        self.epd.defer_busy = True
+        try:
+            if partial:
+                self.epd.EPD_4IN2_V2_PartialDisplay(self._mv)
+            else:
+                self.epd.EPD_4IN2_V2_Display(self._mv)
+        finally:
+            self.epd.defer_busy = False
+        self._busy = True
+    
+    def _draw_static_labels(self, fb):
+        """
+        Draw the parts of the layout that never change (title and labels)
+        Called once at init to build the labels layer.
+        """
+        # Draw title at top
+        self._draw_text(fb, _TITLE, _TITLE_X, 5, 1)
+        
+        # Data block labels on right side starting at x=220
+        right_x = 220
+        
+        # Age block (not available in current API, placeholder)
+        self._draw_text(fb, "Age:", right_x, 45, 1)
+        self._draw_text(fb, "N/A", right_x, 65, 1)
+        
+        self._draw_text(fb, "Illumination:", right_x, 95, 1)
+        
+        # Hemisphere block
+        self._draw_text(fb, "Hemisphere:", right_x, 145, 1)
+        self._draw_text(fb, "North", right_x, 165, 1)
+        
+        self._draw_text(fb, "Moon Rise:", right_x, 195, 1)
+        self._draw_text(fb, "Moon Set:", right_x, 245, 1)
+    
+    def _draw_layout(self, fb, moon_data, location_name, last_update, buf=None):
         """
-        Draw the complete layout on the framebuffer
+        Draw the changing parts of the layout on the framebuffer
         Matches the original Instructables Lunar Phase Tracker layout.
+        The title and labels are already in fb (see _draw_static_labels).
         
         Layout (400x300 pixels):
         - Top: "Lunar Phase Tracker" title
         - Left: Large moon graphic (30, 70)
         - Right: Data blocks at x=220
         - Bottom: Phase name and time
-        """
-        import time
         
+        buf is the bytearray behind fb (optional, enables faster bitmap copies)
+        """
         # Extract data
         phase_name = moon_data.get('phase_name', 'Unknown')
+        phase_index = moon_data.get('phase_index', -1)
         illumination = moon_data.get('illumination', 0)
         moonrise = moon_data.get('moonrise', 'N/A')
         moonset = moon_data.get('moonset', 'N/A')
         
-        # Format current time
-        current_time = time.localtime(last_update)
-        time_str = f"{current_time[3]:02d}:{current_time[4]:02d}"
-        
-        # Draw title at top
-        title = "Lunar Phase Tracker"
-        title_x = (400 - len(title) * 8) // 2
-        self._draw_text(fb, title, title_x, 5, 1)
+        time_str = self._format_clock(last_update)
         
         # Draw moon graphic on left at (30, 70)
-        self._draw_moon_bitmap(fb, phase_name, 30, 70)
+        self._draw_moon_bitmap(fb, phase_name, 30, 70, buf, phase_index)
         
-        # Draw data blocks on right side starting at x=220
+        # Draw data values on right side starting at x=220
         right_x = 220
-        
-        # Age block (not available in current API, placeholder)
-        self._draw_text(fb, "Age:", right_x, 45, 1)
-        self._draw_text(fb, "N/A", right_x, 65, 1)
-        
-        # Illumination block
-        self._draw_text(fb, "Illumination:", right_x, 95, 1)
         self._draw_text(fb, f"{illumination:.1f}%", right_x, 115, 1)
-        
-        # Hemisphere block
-        self._draw_text(fb, "Hemisphere:", right_x, 145, 1)
-        self._draw_text(fb, "North", right_x, 165, 1)
-        
-        # Moon Rise block
-        self._draw_text(fb, "Moon Rise:", right_x, 195, 1)
         self._draw_text(fb, moonrise, right_x, 215, 1)
-        
-        # Moon Set block
-        self._draw_text(fb, "Moon Set:", right_x, 245, 1)
         self._draw_text(fb, moonset, right_x, 265, 1)
         
-        # Draw phase name and time at bottom left
+        self._draw_footer(fb, phase_name, time_str, phase_index)
+    
+    def _format_clock(self, last_update):
+        """Format a timestamp as HH:MM"""
+        # Reuse the last conversion if the timestamp is unchanged
+        if last_update == self._last_time_cache[0]:
+            current_time = self._last_time_cache[1]
+        else:
+            current_time = time.localtime(last_update)
+            self._last_time_cache = (last_update, current_time)
+        return f"{current_time[3]:02d}:{current_time[4]:02d}"
+    
+    def _draw_footer(self, fb, phase_name, time_str, phase_index=-1):
+        """Draw phase name and time at bottom left"""
         # Center phase name in left area (0-220)
-        phase_x = (220 - len(phase_name) * 8) // 2
+        if phase_index >= 0:
+            phase_x = _PHASE_X[phase_index]
+        else:
+            phase_x = (220 - len(phase_name) * 8) // 2
         self._draw_text(fb, phase_name, phase_x, 245, 1)
         
         # Center time below phase
-        time_x = (220 - len(time_str) * 8) // 2
-        self._draw_text(fb, time_str, time_x, 270, 1)
+        self._draw_text(fb, time_str, _TIME_X, 270, 1)
     
     def _draw_text(self, fb, text, x, y, scale=1):
         """
@@ -151,7 +386,7 @@ class DisplayManager:
         except Exception as e:
             print(f"Error drawing text: {e}")
     
-    def _draw_moon_bitmap(self, fb, phase_name, x_pos, y_pos):
+    def _draw_moon_bitmap(self, fb, phase_name, x_pos, y_pos, buf=None, phase_index=-1):
         """
         Draw moon phase bitmap using lunar_graphics module.
         
@@ -159,96 +394,52 @@ class DisplayManager:
             fb: target framebuffer (400x300)
             phase_name: moon phase name
             x_pos, y_pos: top-left corner position
+            buf: bytearray behind fb (optional)
+            phase_index: position in moon_calc.PHASE_NAMES (-1 if unknown)
         """
         try:
-            # Render the moon phase graphic (155x152)
-            moon_fb, moon_buffer = lunar_graphics.render_moon_phase(phase_name)
+            # Moon phase graphic (155x152), rendered once per phase and cached
+            moon_fb, moon_buffer = lunar_graphics.get_phase_buffer(phase_name, phase_index)
             
-            # Copy moon graphic pixel-by-pixel to main framebuffer
-            # This is necessary because MicroPython's framebuf.blit has limited support
-            for dy in range(152):
-                for dx in range(155):
-                    pixel = moon_fb.pixel(dx, dy)
-                    if pixel:  # If pixel is set (black)
-                        fb.pixel(x_pos + dx, y_pos + dy, 1)
+            if buf is not None and _blit_mono_hlsb is not None:
+                # Native-code OR-merge straight into the screen buffer
+                _blit_mono_hlsb(buf, moon_buffer, self.width // 8, (155 + 7) // 8,
+                                x_pos, y_pos, 155, 152)
+            else:
+                # Copy in C with white (0) as the transparent key colour
+                fb.blit(moon_fb, x_pos, y_pos, 0)
             
-            print(f"Drew moon bitmap: {phase_name}")
+            if self.debug:
+                print("Drew moon bitmap:", phase_name)
         except Exception as e:
             print(f"Error drawing moon bitmap: {e}")
             # Fallback to simple circle if bitmap fails
-            self._draw_moon_phase_graphic(fb, phase_name, x_pos + 77, y_pos + 76, 60)
+            self._draw_moon_phase_graphic(fb, phase_index, x_pos + 77, y_pos + 76, 60)
     
-    def _draw_moon_phase_graphic(self, fb, phase_name, center_x, center_y, radius=50):
+    def _draw_moon_phase_graphic(self, fb, phase_index, center_x, center_y, radius=50):
         """
         Draw a simple moon phase graphic
         For a real implementation, you'd load pre-rendered bitmaps
         
         Args:
             fb: framebuffer
-            phase_name: name of the moon phase
+            phase_index: position in moon_calc.PHASE_NAMES (-1 if unknown)
             center_x: x coordinate of center
             center_y: y coordinate of center
             radius: radius of the moon circle (default 50)
         """
-        # Draw moon circle outline
-        self._draw_circle(fb, center_x, center_y, radius, filled=False)
-        
-        # Draw a filled circle for the moon body
-        self._draw_circle(fb, center_x, center_y, radius - 2, filled=True)
+        # Draw a filled circle for the moon body (its edge doubles as the outline).
+        # framebuf.ellipse runs the whole midpoint circle in C.
+        fb.ellipse(center_x, center_y, radius, radius, 1, True)
         
         # For simplicity, we'll use text representation in the center
         # In production, load actual moon phase images
-        phase_symbols = {
-            "New Moon": "●",
-            "Waxing Crescent": ")",
-            "First Quarter": "◐",
-            "Waxing Gibbous": "◑",
-            "Full Moon": "○",
-            "Waning Gibbous": "◒",
-            "Last Quarter": "◓",
-            "Waning Crescent": "("
-        }
-        
-        symbol = phase_symbols.get(phase_name, "?")
+        symbol = _PHASE_SYMBOLS[phase_index] if phase_index >= 0 else "?"
         # Center the symbol (approximate)
         self._draw_text(fb, symbol, center_x - 4, center_y - 4, 1)
     
-    def _draw_circle(self, fb, x0, y0, radius, filled=False):
-        """
-        Draw a circle using Bresenham's algorithm
-        Color 1 = black pixels
-        """
-        x = radius
-        y = 0
-        err = 0
-        
-        while x >= y:
-            if filled:
-                fb.hline(x0 - x, y0 + y, 2 * x, 1)  # Black fill
-                fb.hline(x0 - x, y0 - y, 2 * x, 1)
-                fb.hline(x0 - y, y0 + x, 2 * y, 1)
-                fb.hline(x0 - y, y0 - x, 2 * y, 1)
-            else:
-                fb.pixel(x0 + x, y0 + y, 1)  # Black outline
-                fb.pixel(x0 + y, y0 + x, 1)
-                fb.pixel(x0 - y, y0 + x, 1)
-                fb.pixel(x0 - x, y0 + y, 1)
-                fb.pixel(x0 - x, y0 - y, 1)
-                fb.pixel(x0 - y, y0 - x, 1)
-                fb.pixel(x0 + y, y0 - x, 1)
-                fb.pixel(x0 + x, y0 - y, 1)
-            
-            if err <= 0:
-                y += 1
-                err += 2 * y + 1
-            
-            if err > 0:
-                x -= 1
-                err -= 2 * x + 1
-    
     def _simulate_display(self, moon_data, location_name, last_update):
         """Simulate display output for testing without hardware"""
-        import time
         
         print("\n" + "=" * 50)
         print("DISPLAY OUTPUT (Simulated)")
@@ -275,8 +466,11 @@ class DisplayManager:
             return
         
         try:
+            self.wait_drawn()
+            self.wait_idle()
             self.epd.Sleep()
-            print("Display sleeping")
+            if self.debug:
+                print("Display sleeping")
         except Exception as e:
             print(f"Error sleeping display: {e}")
     
@@ -288,7 +482,13 @@ class DisplayManager:
         
         try:
             # Re-initialize the display after sleep
+            self.wait_drawn()
+            self.wait_idle()
             self.epd.EPD_4IN2_V2_Init()
-            print("Display awake")
+            # Init resets the panel's copy of the old frame, so the next
+            # change needs a full refresh
+            self._partial_count = _FULL_REFRESH_EVERY
+            if self.debug:
+                print("Display awake")
         except Exception as e:
             print(f"Error waking display: {e}")
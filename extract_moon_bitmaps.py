@@ -2,6 +2,8 @@
 """
 Extract moon phase bitmaps from the Instructables fontLunar.c file.
 Converts C hex arrays to Python bytes format for MicroPython e-ink display.
+Writes lunar_bitmaps.py, which lunar_graphics.py uses instead of rendering
+the phases itself when it is present on the device.
 
 The original font file contains 155x152 pixel moon phase bitmaps stored as:
 - 152 rows per image
@@ -19,27 +21,29 @@ Phase mapping (from Arduino code):
 - '7' (ASCII 55) = Waning Crescent
 """
 
+import binascii
 import re
 
+# Hex byte values in the C arrays: 0xAB, 0xCD, ...
+PAT = re.compile(rb'0x([0-9A-Fa-f]{2})')
+
+# Character marker comments, e.g. "// @0 ' ' (155 pixels wide)".
+# Group 1 is the first quoted character on the line.
+MARKER = re.compile(rb"^(?=[^\n]*@)(?=[^\n]*pixels wide)[^\n]*?'(.)'", re.M)
+
+BYTES_PER_ROW = 20  # 155 pixels / 8 bits = 19.375 -> 20 bytes
+ROWS = 152
+
 def extract_bitmaps():
     """Extract moon phase bitmaps from fontLunar.c"""
     
     # Read the source file
-    with open('F9ECFA7JGSG75F7/EPD-master/fontLunar.c', 'r') as f:
+    with open('F9ECFA7JGSG75F7/EPD-master/fontLunar.c', 'rb') as f:
         content = f.read()
     
-    # Split into lines for processing
-    lines = content.split('\n')
-    
-    # Find all character markers
-    char_starts = []
-    for i, line in enumerate(lines):
-        if '@' in line and 'pixels wide' in line:
-            # Extract character code
-            match = re.search(r"'(.)'", line)
-            if match:
-                char = match.group(1)
-                char_starts.append((i, char, line))
+    # Find all character markers in one scan: (offset after marker, char)
+    char_starts = [(m.end(), m.group(1).decode('latin-1'))
+                   for m in MARKER.finditer(content)]
     
     print(f"Found {len(char_starts)} characters in font file")
     
@@ -55,46 +59,75 @@ def extract_bitmaps():
         
         # Find this character in the font
         found_idx = None
-        for idx, (line_num, found_char, line_text) in enumerate(char_starts):
+        for idx, (offset, found_char) in enumerate(char_starts):
             if found_char == char:
                 found_idx = idx
-                print(f"  Found at line {line_num}")
+                print(f"  Found at offset {offset}")
                 break
         
         if found_idx is None:
             print(f"  WARNING: Character '{char}' not found in font file!")
             continue
         
-        # Extract 152 lines of hex data starting from the marker
-        start_line = char_starts[found_idx][0] + 1
-        end_line = char_starts[found_idx + 1][0] if found_idx + 1 < len(char_starts) else len(lines)
+        # The bitmap runs from this marker to the next one
+        start_off = char_starts[found_idx][0]
+        end_off = char_starts[found_idx + 1][0] if found_idx + 1 < len(char_starts) else len(content)
         
-        # Parse hex bytes from lines
-        bitmap_bytes = []
-        for line_idx in range(start_line, min(start_line + 152, end_line)):
-            line = lines[line_idx]
-            # Extract hex values: 0xAB, 0xCD, ...
-            hex_values = re.findall(r'0x([0-9A-Fa-f]{2})', line)
-            if hex_values:
-                # Take only first 20 bytes per row (155 pixels / 8 bits = 19.375 -> 20 bytes)
-                for hex_val in hex_values[:20]:
-                    bitmap_bytes.append(int(hex_val, 16))
+        # All hex bytes of the block in one call; rows are 20 bytes each,
+        # so the first 152 * 20 values are the whole image
+        hex_values = PAT.findall(content, start_off, end_off)[:ROWS * BYTES_PER_ROW]
+        bitmap_bytes = binascii.unhexlify(b''.join(hex_values))
         
-        print(f"  Extracted {len(bitmap_bytes)} bytes ({len(bitmap_bytes)//20} rows)")
-        extracted[phase_name] = bytes(bitmap_bytes)
+        print(f"  Extracted {len(bitmap_bytes)} bytes ({len(bitmap_bytes)//BYTES_PER_ROW} rows)")
+        extracted[phase_name] = bitmap_bytes
     
     return extracted
 
+def rle_encode(data):
+    """
+    Run-length encode a bitmap for lunar_graphics.decode_rle().
+    
+    Control byte c, then:
+    - c >= 0x80: one value byte, repeated (c - 0x80) + 3 times (runs of 3-130)
+    - c < 0x80: c + 1 literal bytes (1-128)
+    """
+    out = bytearray()
+    literal = bytearray()
+    
+    def flush_literal():
+        for start in range(0, len(literal), 128):
+            chunk = literal[start:start + 128]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+        literal.clear()
+    
+    i = 0
+    while i < len(data):
+        run = 1
+        while i + run < len(data) and data[i + run] == data[i] and run < 130:
+            run += 1
+        if run >= 3:
+            flush_literal()
+            out.append(0x80 + run - 3)
+            out.append(data[i])
+            i += run
+        else:
+            literal.append(data[i])
+            i += 1
+    flush_literal()
+    return bytes(out)
+
 def write_python_module(bitmaps):
-    """Write extracted bitmaps to lunar_graphics.py module"""
+    """Write extracted bitmaps to lunar_bitmaps.py module"""
     
-    with open('lunar_graphics.py', 'w') as f:
+    with open('lunar_bitmaps.py', 'w') as f:
         f.write('''"""
 Moon Phase Bitmap Graphics for Pico 2W E-ink Display
 Extracted from Instructables Lunar Phase Tracker project.
 
 Each bitmap is 155 pixels wide x 152 pixels tall (20 bytes x 152 rows = 3040 bytes).
-Format: 1-bit monochrome, MSB first, row-major order.
+Format: 1-bit monochrome, MSB first, row-major order, run-length encoded
+(see extract_moon_bitmaps.rle_encode; decode with lunar_graphics.decode_rle).
 
 Original source: https://www.instructables.com/Lunar-Phase-Tracker/
 """
@@ -102,21 +135,23 @@ Original source: https://www.instructables.com/Lunar-Phase-Tracker/
 BITMAP_WIDTH = 155  # pixels
 BITMAP_HEIGHT = 152  # pixels
 BYTES_PER_ROW = 20  # (155 + 7) // 8
+BITMAP_FORMAT = 'rle'
 
 ''')
         
-        # Write each bitmap
+        # Write each bitmap as an RLE bytes literal (kept in flash when frozen,
+        # unlike bytes([...]) which builds a list at import)
+        raw_total = rle_total = 0
         for phase_name, bitmap_data in sorted(bitmaps.items()):
-            f.write(f"\n# {phase_name} Moon\n")
-            f.write(f"BITMAP_{phase_name.upper()} = bytes([\n")
-            
-            # Write bytes in rows of 20 for readability
-            for row in range(0, len(bitmap_data), 20):
-                row_bytes = bitmap_data[row:row+20]
-                hex_str = ', '.join(f'0x{b:02X}' for b in row_bytes)
-                f.write(f"    {hex_str},\n")
+            rle_data = rle_encode(bitmap_data)
+            raw_total += len(bitmap_data)
+            rle_total += len(rle_data)
             
-            f.write("])\n")
+            f.write(f"\n# {phase_name} Moon ({len(rle_data)} bytes RLE)\n")
+            f.write(f"BITMAP_{phase_name.upper()}_RLE = (\n")
+            for start in range(0, len(rle_data), 20):
+                f.write(f"    {bytes(rle_data[start:start + 20])!r}\n")
+            f.write(")\n")
         
         # Write lookup function
         f.write('''
@@ -129,27 +164,28 @@ def get_phase_bitmap(phase_name):
                    'Waxing Gibbous', 'Waning Gibbous', 'Last Quarter', 'Waning Crescent'
     
     Returns:
-        bytes object containing the bitmap data (3040 bytes)
+        bytes object containing the RLE bitmap data (3040 bytes decoded)
     """
     phase_map = {
-        'Full': BITMAP_FULL,
-        'Full Moon': BITMAP_FULL,
-        'New': BITMAP_NEW,
-        'New Moon': BITMAP_NEW,
-        'Waxing Crescent': BITMAP_WAXINGCRESCENT,
-        'First Quarter': BITMAP_FIRSTQUARTER,
-        'Waxing Half': BITMAP_FIRSTQUARTER,  # Alias
-        'Waxing Gibbous': BITMAP_WAXINGGIBBOUS,
-        'Waning Gibbous': BITMAP_WANINGGIBBOUS,
-        'Last Quarter': BITMAP_LASTQUARTER,
-        'Waning Half': BITMAP_LASTQUARTER,  # Alias
-        'Waning Crescent': BITMAP_WANINGCRESCENT,
+        'Full': BITMAP_FULL_RLE,
+        'Full Moon': BITMAP_FULL_RLE,
+        'New': BITMAP_NEW_RLE,
+        'New Moon': BITMAP_NEW_RLE,
+        'Waxing Crescent': BITMAP_WAXINGCRESCENT_RLE,
+        'First Quarter': BITMAP_FIRSTQUARTER_RLE,
+        'Waxing Half': BITMAP_FIRSTQUARTER_RLE,  # Alias
+        'Waxing Gibbous': BITMAP_WAXINGGIBBOUS_RLE,
+        'Waning Gibbous': BITMAP_WANINGGIBBOUS_RLE,
+        'Last Quarter': BITMAP_LASTQUARTER_RLE,
+        'Waning Half': BITMAP_LASTQUARTER_RLE,  # Alias
+        'Waning Crescent': BITMAP_WANINGCRESCENT_RLE,
     }
     
     return phase_map.get(phase_name)
 ''')
 
-    print(f"\nWrote lunar_graphics.py with {len(bitmaps)} moon phase bitmaps")
+    print(f"\nWrote lunar_bitmaps.py with {len(bitmaps)} moon phase bitmaps")
+    print(f"  RLE: {raw_total} -> {rle_total} bytes")
 
 if __name__ == '__main__':
     print("Extracting moon phase bitmaps from fontLunar.c...")
@@ -157,7 +193,7 @@ if __name__ == '__main__':
     
     if bitmaps:
         write_python_module(bitmaps)
-        print("\n✓ Complete! Generated lunar_graphics.py")
+        print("\n✓ Complete! Generated lunar_bitmaps.py")
         
         # Calculate total size
         total_bytes = sum(len(b) for b in bitmaps.values())
@@ -3,53 +3,104 @@ Moon Phase Graphics for Pico 2W E-ink Display
 Programmatically renders moon phase graphics to match the original Instructables project aesthetic.
 
 Renders 8 moon phases with accurate illumination patterns.
+If lunar_bitmaps.py (generated by extract_moon_bitmaps.py) is on the device,
+its pre-drawn bitmaps are used instead and nothing is rendered at all.
 """
 
-import framebuf
-import math
+try:
+    import framebuf
+except ImportError:
+    framebuf = None  # Host side (e.g. test_rle.py): only decode_rle is usable
+
+try:
+    import lunar_bitmaps
+except ImportError:
+    lunar_bitmaps = None  # No pre-extracted bitmaps, render them instead
+
+try:
+    import micropython
+except ImportError:
+    micropython = None  # Not running on MicroPython
 
 MOON_SIZE = 140  # Diameter in pixels (fits well in 155x152 area)
 
+# Rendered phases by phase_index (or by name if the index is unknown):
+# (framebuffer, buffer). Only 8 phases exist, so each one is rendered once
+# and reused for the rest of the run.
+_PHASE_CACHE = {}
+
+def _decode_rle_py(src, n, dst):
+    """Plain Python version of _decode_rle, used off MicroPython"""
+    i = 0
+    o = 0
+    while i < n:
+        c = src[i]
+        i += 1
+        if c >= 0x80:
+            # Run: one value repeated (c - 0x80) + 3 times
+            count = c - 0x80 + 3
+            dst[o:o + count] = bytes((src[i],)) * count
+            i += 1
+        else:
+            # Literal: the next c + 1 bytes as they are
+            count = c + 1
+            dst[o:o + count] = src[i:i + count]
+            i += count
+        o += count
+
+_decode_rle = _decode_rle_py
+if micropython is not None:
+    @micropython.viper
+    def _decode_rle(src: ptr8, n: int, dst: ptr8):
+        # Same format as _decode_rle_py, written byte by byte in native code
+        i = 0
+        o = 0
+        while i < n:
+            c = int(src[i])
+            i += 1
+            if c >= 0x80:
+                count = c - 0x80 + 3
+                v = int(src[i])
+                i += 1
+                while count > 0:
+                    dst[o] = v
+                    o += 1
+                    count -= 1
+            else:
+                count = c + 1
+                while count > 0:
+                    dst[o] = src[i]
+                    o += 1
+                    i += 1
+                    count -= 1
+
+def decode_rle(src, dst):
+    """
+    Expand a run-length encoded bitmap (see extract_moon_bitmaps.rle_encode)
+    into dst, which must be large enough for the decoded bytes.
+    """
+    _decode_rle(src, len(src), dst)
+
 def draw_circle_filled(fb, x, y, r, color):
-    """Draw a filled circle using Bresenham's algorithm"""
-    for dy in range(-r, r + 1):
-        dx = int(math.sqrt(r * r - dy * dy))
-        fb.hline(x - dx, y + dy, 2 * dx + 1, color)
+    """Draw a filled circle (framebuf.ellipse does the work in C)"""
+    fb.ellipse(x, y, r, r, color, True)
 
 def draw_circle_outline(fb, x, y, r, color):
-    """Draw a circle outline"""
-    f = 1 - r
-    ddF_x = 0
-    ddF_y = -2 * r
-    x1 = 0
-    y1 = r
-    
-    fb.pixel(x, y + r, color)
-    fb.pixel(x, y - r, color)
-    fb.pixel(x + r, y, color)
-    fb.pixel(x - r, y, color)
-    
-    while x1 < y1:
-        if f >= 0:
-            y1 -= 1
-            ddF_y += 2
-            f += ddF_y
-        x1 += 1
-        ddF_x += 2
-        f += ddF_x + 1
-        
-        fb.pixel(x + x1, y + y1, color)
-        fb.pixel(x - x1, y + y1, color)
-        fb.pixel(x + x1, y - y1, color)
-        fb.pixel(x - x1, y - y1, color)
-        fb.pixel(x + y1, y + x1, color)
-        fb.pixel(x - y1, y + x1, color)
-        fb.pixel(x + y1, y - x1, color)
-        fb.pixel(x - y1, y - x1, color)
+    """Draw a circle outline (framebuf.ellipse does the work in C)"""
+    fb.ellipse(x, y, r, r, color, False)
+
+# framebuf.ellipse quadrant masks (bit 0 = top right, counter-clockwise)
+_RIGHT_HALF = 0b1001  # Q1 + Q4
+_LEFT_HALF = 0b0110   # Q2 + Q3
 
 def draw_crescent(fb, center_x, center_y, radius, illumination, waxing=True, color=1):
     """
-    Draw a crescent moon by drawing two circles and using their overlap.
+    Draw a partly lit moon from a half disc and a half ellipse.
+    
+    The terminator (shadow line) is half an ellipse with the moon's height
+    and a width that shrinks to 0 at 50% and grows back to the radius at
+    0% and 100%. Everything is drawn with framebuf.ellipse quadrant masks,
+    so each phase is a few C calls instead of one Python call per row.
     
     Args:
         fb: framebuffer to draw on
@@ -59,61 +110,25 @@ def draw_crescent(fb, center_x, center_y, radius, illumination, waxing=True, col
         waxing: True for waxing (right side lit), False for waning (left side lit)
         color: color to draw (1=black, 0=white for most e-ink)
     """
-    # Draw full circle outline
-    draw_circle_outline(fb, center_x, center_y, radius, color)
+    lit_side = _RIGHT_HALF if waxing else _LEFT_HALF
+    dark_side = _LEFT_HALF if waxing else _RIGHT_HALF
     
-    # For crescent and gibbous, we need to draw the terminator (shadow line)
-    # Calculate the x-offset of the terminator from center
-    # illumination 0% = -radius (new moon, terminator at left edge)
-    # illumination 50% = 0 (half moon, terminator at center)
-    # illumination 100% = +radius (full moon, terminator at right edge)
-    
-    # Map illumination (0-100) to terminator position (-radius to +radius)
-    terminator_x_offset = int((illumination / 50.0 - 1.0) * radius)
-    
-    if not waxing:
-        terminator_x_offset = -terminator_x_offset
-    
-    # Draw the lit portion (fill from edge to terminator)
-    if illumination < 50:  # Crescent
-        # Draw the crescent by filling pixels
-        for dy in range(-radius, radius + 1):
-            y = center_y + dy
-            # Calculate the x extent of the circle at this y
-            dx_circle = int(math.sqrt(max(0, radius * radius - dy * dy)))
-            
-            if waxing:
-                # Light on right side
-                x_start = center_x + terminator_x_offset
-                x_end = center_x + dx_circle
-            else:
-                # Light on left side
-                x_start = center_x - dx_circle
-                x_end = center_x + terminator_x_offset
-            
-            if x_end > x_start:
-                fb.hline(x_start, y, x_end - x_start + 1, color)
-    else:  # Gibbous or full
-        # Fill most of circle, leave shadow
-        draw_circle_filled(fb, center_x, center_y, radius, color)
-        
-        if illumination < 100:
-            # Draw shadow crescent on opposite side
-            for dy in range(-radius, radius + 1):
-                y = center_y + dy
-                dx_circle = int(math.sqrt(max(0, radius * radius - dy * dy)))
-                
-                if waxing:
-                    # Shadow on left
-                    x_start = center_x - dx_circle
-                    x_end = center_x + terminator_x_offset
-                else:
-                    # Shadow on right
-                    x_start = center_x + terminator_x_offset
-                    x_end = center_x + dx_circle
-                
-                if x_end > x_start:
-                    fb.hline(x_start, y, x_end - x_start + 1, 0)  # 0 = white (shadow)
+    # Half width of the terminator ellipse: radius at 0%, 0 at 50%, radius at 100%
+    terminator = abs(int((1.0 - illumination / 50.0) * radius))
+    
+    # Lit half of the disc
+    fb.ellipse(center_x, center_y, radius, radius, color, True, lit_side)
+    
+    # Crescent: cut the terminator ellipse out of the lit half.
+    # Gibbous: add it to the dark half. (ellipse() needs a non-zero width)
+    if terminator > 0:
+        if illumination < 50:
+            fb.ellipse(center_x, center_y, terminator, radius, 0, True, lit_side)
+        else:
+            fb.ellipse(center_x, center_y, terminator, radius, color, True, dark_side)
+    
+    # Outline last so the cut above doesn't break it
+    draw_circle_outline(fb, center_x, center_y, radius, color)
 
 def render_moon_phase(phase_name):
     """
@@ -126,10 +141,27 @@ def render_moon_phase(phase_name):
     Returns:
         framebuffer.FrameBuffer object (155x152, MONO_HLSB format)
     """
+    # Use the pre-extracted bitmap if we have one. Same 155x152 MONO_HLSB
+    # layout (20 bytes per row); copied to a bytearray because FrameBuffer
+    # needs a writable buffer. Newer lunar_bitmaps.py files are RLE encoded.
+    if lunar_bitmaps is not None:
+        bitmap = lunar_bitmaps.get_phase_bitmap(phase_name)
+        if bitmap is not None:
+            if getattr(lunar_bitmaps, 'BITMAP_FORMAT', None) == 'rle':
+                buffer = bytearray(lunar_bitmaps.BYTES_PER_ROW * lunar_bitmaps.BITMAP_HEIGHT)
+                decode_rle(bitmap, buffer)
+            else:
+                buffer = bytearray(bitmap)
+            fb = framebuf.FrameBuffer(buffer, lunar_bitmaps.BITMAP_WIDTH,
+                                      lunar_bitmaps.BITMAP_HEIGHT, framebuf.MONO_HLSB)
+            return fb, buffer
+    
     # Create framebuffer (155x152 pixels, 1-bit monochrome)
+    # Each MONO_HLSB row is padded to whole bytes: 20 bytes x 152 rows = 3040
     width, height = 155, 152
-    buffer = bytearray((width * height) // 8 + 1)
-    fb = framebuf.FrameBuffer(buffer, width, height, framebuf.MONO_HLSB)
+    stride = (width + 7) // 8  # Bytes per MONO_HLSB row
+    buffer = bytearray(stride * height)
+    fb = framebuf.FrameBuffer(buffer, width, height, framebuf.MONO_HLSB, stride * 8)
     
     # Clear to white
     fb.fill(0)
@@ -182,15 +214,20 @@ def render_moon_phase(phase_name):
     
     return fb, buffer
 
-# Pre-render common phases for faster access (optional)
-def get_phase_buffer(phase_name):
+def get_phase_buffer(phase_name, phase_index=-1):
     """
-    Get a pre-rendered moon phase buffer.
+    Get a pre-rendered moon phase buffer (rendered on first use, then cached).
     
     Args:
         phase_name: Phase name (e.g., 'Full', 'New', 'Waxing Crescent', etc.)
+        phase_index: position in moon_calc.PHASE_NAMES (-1 if unknown)
     
     Returns:
         tuple: (framebuffer, buffer_bytes)
     """
-    return render_moon_phase(phase_name)
+    key = phase_index if phase_index >= 0 else phase_name
+    entry = _PHASE_CACHE.get(key)
+    if entry is None:
+        entry = render_moon_phase(phase_name)
+        _PHASE_CACHE[key] = entry
+    return entry
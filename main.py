@@ -30,21 +30,24 @@ class MoonTracker:
         
         # Initialize components
         self.storage = Storage()
-        self.wifi = WiFiManager(config.WIFI_SSID, config.WIFI_PASSWORD)
+        self.wifi = WiFiManager(config.WIFI_SSID, config.WIFI_PASSWORD, debug=config.DEBUG)
         self.api_client = MoonAPIClient(
             config.RAPIDAPI_KEY,
             config.RAPIDAPI_HOST,
             config.LATITUDE,
-            config.LONGITUDE
+            config.LONGITUDE,
+            mode='basic',  # Verification only compares phase, illumination and age
+            debug=config.DEBUG
         )
         self.moon_calc = MoonCalculator(
             config.LATITUDE,
             config.LONGITUDE,
             config.TIMEZONE_OFFSET
         )
-        self.display = DisplayManager()
+        self.display = DisplayManager(debug=config.DEBUG)
         
         self.last_phase_name = None  # Track phase changes
+        self._last_cycle_minute = -1  # time.time() // 60 of the last update
         
         # Setup complete
         print("Initialization complete\n")
@@ -59,34 +62,29 @@ class MoonTracker:
         while True:
             try:
                 loop_count += 1
-                print(f"\n--- Update Cycle {loop_count} ---")
-                
-                # Calculate current moon phase locally
-                moon_data = self.moon_calc.calculate_moon_phase()
-                
                 if config.DEBUG:
-                    print(f"Local calculation: {moon_data['phase_name']} " +
-                          f"({moon_data['illumination']:.1f}%)")
+                    print(f"\n--- Update Cycle {loop_count} ---")
                 
-                # Check if we need API verification (once per day)
-                if self._should_sync_api():
-                    self._sync_with_api(moon_data)
+                # The display only shows the time to the minute, so a cycle
+                # in the same minute as the last one has nothing to do
+                now = time.time()
+                now_min = now // 60
+                if now_min != self._last_cycle_minute:
+                    self._last_cycle_minute = now_min
+                    self._update_cycle(now)
+                elif config.DEBUG:
+                    print("Same minute as last update, nothing to do")
                 
-                # Update display
-                self.display.draw_moon_data(
-                    moon_data,
-                    config.LOCATION_NAME,
-                    time.time()
-                )
+                # Write any changed sync times to flash (once per cycle at most)
+                self.storage.flush()
                 
-                # Store last phase for change detection
-                self.last_phase_name = moon_data['phase_name']
-                
-                # Memory cleanup
-                gc.collect()
+                # Memory cleanup (not needed before deep sleep, which resets RAM)
+                if not config.ENABLE_DEEP_SLEEP:
+                    gc.collect()
                 
                 # Sleep until next update
-                print(f"Sleeping for {config.LOCAL_UPDATE_INTERVAL} seconds...")
+                if config.DEBUG:
+                    print(f"Sleeping for {config.LOCAL_UPDATE_INTERVAL} seconds...")
                 
                 if config.ENABLE_DEEP_SLEEP:
                     self._deep_sleep(config.LOCAL_UPDATE_INTERVAL)
@@ -102,6 +100,34 @@ class MoonTracker:
                 print("Waiting 60 seconds before retry...")
                 time.sleep(60)
     
+    def _update_cycle(self, now):
+        """Calculate the moon phase, verify with the API if due and redraw"""
+        # Calculate current moon phase locally
+        moon_data = self.moon_calc.calculate_moon_phase(now)
+        
+        if config.DEBUG:
+            print(f"Local calculation: {moon_data['phase_name']} " +
+                  f"({moon_data['illumination']:.1f}%)")
+        
+        # Check if we need API verification (once per day)
+        if self._should_sync_api(now):
+            self._sync_with_api(moon_data)
+
+            # The sync may have stepped the clock (NTP), so read it again
+            now = time.time()
+            self._last_cycle_minute = now // 60
+            moon_data = self.moon_calc.calculate_moon_phase(now)
+        
+        # Update display (skipped if nothing on screen changed)
+        self.display.draw_moon_data(
+            moon_data,
+            config.LOCATION_NAME,
+            now
+        )
+        
+        # Store last phase for change detection
+        self.last_phase_name = moon_data['phase_name']
+    
     def initial_sync(self):
         """Perform initial WiFi and time synchronization"""
         print("=== Initial Setup ===")
@@ -113,7 +139,8 @@ class MoonTracker:
             if ntp_time:
                 self.storage.set_last_ntp_sync(ntp_time)
                 self.storage.set_boot_time(ntp_time)
-                print(f"Time synced: {time.localtime(ntp_time)}")
+                if config.DEBUG:
+                    print(f"Time synced: {time.localtime(ntp_time)}")
             
             # Optional: Do initial API call for verification
             if config.DEBUG:
@@ -122,6 +149,7 @@ class MoonTracker:
                 if api_data:
                     print("API test successful!")
                     self.storage.set_last_api_sync(time.time())
+                self.api_client.close()
             
             # Disconnect WiFi to save power (will reconnect for daily sync)
             # self.wifi.disconnect()
@@ -131,13 +159,12 @@ class MoonTracker:
         
         print("=== Setup Complete ===\n")
     
-    def _should_sync_api(self):
-        """Check if it's time for daily API verification"""
+    def _should_sync_api(self, now):
+        """Check if it's time for daily API verification (now = time.time())"""
         last_sync = self.storage.get_last_api_sync()
-        current_time = time.time()
         
         # Sync if more than API_UPDATE_INTERVAL has passed
-        time_since_sync = current_time - last_sync
+        time_since_sync = now - last_sync
         return time_since_sync >= config.API_UPDATE_INTERVAL
     
     def _sync_with_api(self, local_data):
@@ -150,25 +177,33 @@ class MoonTracker:
                 print("WiFi connection failed, skipping API sync")
                 return
         
+        # Send the NTP query first so its round trip overlaps the API request
+        ntp_request = self.wifi.start_ntp_request()
+        
         # Fetch API data
         api_data = self.api_client.get_moon_data()
         
+        # Pick up the NTP reply (already waiting by now) and re-sync the clock
+        ntp_time = self.wifi.finish_ntp_request(ntp_request)
+        if ntp_time:
+            self.storage.set_last_ntp_sync(ntp_time)
+        
         if api_data:
             # Compare with local calculation
             comparison = self.moon_calc.compare_with_api(local_data, api_data)
             
             if config.DEBUG and comparison:
-                print(f"Illumination difference: {comparison['illumination_diff']:.2f}%")
-                print(f"Age difference: {comparison['age_diff']:.2f} days")
+                # None = the API response didn't include that field
+                print(f"Illumination difference: {comparison['illumination_diff']}%")
+                print(f"Age difference: {comparison['age_diff']} days")
                 print(f"Phase match: {comparison['phase_name_match']}")
             
-            # Update last sync time
-            self.storage.set_last_api_sync(time.time())
-            
-            # Also re-sync NTP time while we're connected
-            ntp_time = self.wifi.sync_time_ntp()
-            if ntp_time:
-                self.storage.set_last_ntp_sync(ntp_time)
+            # Update last sync time (the NTP reply already read the clock)
+            self.storage.set_last_api_sync(ntp_time or time.time())
+        
+        # The next request is a day away, so don't keep the TLS session
+        # (and its buffers) in RAM until then
+        self.api_client.close()
         
         # Disconnect to save power
         # self.wifi.disconnect()
@@ -193,6 +228,8 @@ class MoonTracker:
         """Clean shutdown"""
         print("Shutting down...")
         self.display.sleep()
+        self.storage.flush()
+        self.api_client.close()
         self.wifi.disconnect()
         print("Goodbye!")
 
@@ -5,185 +5,243 @@ Based on Jean Meeus "Astronomical Algorithms" and simplified formulas
 import math
 import time
 
+# Unix time of J2000.0 (JDE 2451545.0, 2000-01-01 12:00 TT), shifted by the
+# ~69s TT-UTC difference so UTC timestamps give Meeus' dynamical time
+J2000_UNIX_TT = 946727931
+
+# Meeus ch. 47 polynomials in T (Julian centuries since J2000.0), in degrees,
+# with the divisions folded into constants for Horner evaluation
+# D: mean elongation of the moon, M: sun's mean anomaly, MP: moon's mean anomaly
+_D = (297.8501921, 445267.1114034, -0.0018819, 1.0 / 545868, -1.0 / 113065000)
+_M = (357.5291092, 35999.0502909, -0.0001536, 1.0 / 24490000)
+_MP = (134.9633964, 477198.8675055, 0.0087414, 1.0 / 69699, -1.0 / 14712000)
+_DEG = math.pi / 180
+
+# Synodic month (new moon to new moon) in days, and factors derived from it
+# once here so the calculations multiply instead of divide
+SYNODIC_MONTH = 29.53058867
+INV_SYNODIC = 1.0 / SYNODIC_MONTH
+TWO_PI_OVER_SYNODIC = 2.0 * math.pi / SYNODIC_MONTH
+DAYS_PER_DEGREE = SYNODIC_MONTH / 360.0
+
+# The phase and illumination are worked out in fixed point: the position in
+# the cycle is an int in units of 1/2**20 of a synodic month, which keeps
+# every intermediate value a small int (no heap allocation, unlike floats)
+_FP_BITS = 20
+_FP_ONE = 1 << _FP_BITS
+_FP_PER_DEGREE = _FP_ONE / 360.0
+
+# Illumination in units of 0.0001% for the first half of the cycle (new to
+# full moon) in 256 steps of _ILLUM_STEP, for _illumination_fp() below
+_ILLUM_SHIFT = _FP_BITS - 1 - 8
+_ILLUM_STEP = 1 << _ILLUM_SHIFT
+_ILLUM_LUT = tuple(int((1 - math.cos(i * math.pi / 256)) * 500000 + 0.5)
+                   for i in range(257))
+
+def _illumination_fp(pos):
+    """
+    Illumination in units of 0.0001% at cycle position pos (0 to _FP_ONE),
+    interpolated from _ILLUM_LUT with integer maths only
+    Accurate to about 0.001%, below the 0.01% illumination is shown with.
+    """
+    # The second half of the cycle mirrors the first
+    if pos > _FP_ONE >> 1:
+        pos = _FP_ONE - pos
+    i = pos >> _ILLUM_SHIFT
+    if i >= 256:
+        return _ILLUM_LUT[256]
+    a = _ILLUM_LUT[i]
+    return a + (((_ILLUM_LUT[i + 1] - a) * (pos & (_ILLUM_STEP - 1))) >> _ILLUM_SHIFT)
+
+def _elongation(timestamp):
+    """
+    Moon-sun elongation in degrees (0-360, 0 = new moon) at a Unix timestamp
+    Meeus "Astronomical Algorithms" ch. 48, low accuracy version: the mean
+    elongation plus the six largest periodic terms, good to a few
+    hundredths of a day in moon age.
+    """
+    # Julian centuries since J2000.0. Days are counted from the integer
+    # timestamp rather than a Julian Date, which keeps the precision on
+    # MicroPython's single-precision floats.
+    T = (timestamp - J2000_UNIX_TT) / 86400.0 / 36525.0
+    
+    d = _D[0] + T * (_D[1] + T * (_D[2] + T * (_D[3] + T * _D[4])))
+    m = _M[0] + T * (_M[1] + T * (_M[2] + T * _M[3]))
+    mp = _MP[0] + T * (_MP[1] + T * (_MP[2] + T * (_MP[3] + T * _MP[4])))
+    d_deg = d % 360.0
+    d = d_deg * _DEG
+    m = (m % 360.0) * _DEG
+    mp = (mp % 360.0) * _DEG
+    
+    # Elongation = 180 - phase angle i (Meeus 48.4)
+    elongation = (d_deg
+                  + 6.289 * math.sin(mp)
+                  - 2.100 * math.sin(m)
+                  + 1.274 * math.sin(2 * d - mp)
+                  + 0.658 * math.sin(2 * d)
+                  + 0.214 * math.sin(2 * mp)
+                  + 0.110 * math.sin(d))
+    return elongation % 360.0
+
+def _format_hhmm(total_minutes):
+    """Convert minutes since midnight to HH:MM format"""
+    hours, minutes = divmod(total_minutes, 60)
+    return f"{hours:02d}:{minutes:02d}"
+
+# Phase names in order through the lunar cycle.
+# A phase's position in this tuple is its phase_index.
+PHASE_NAMES = (
+    "New Moon",
+    "Waxing Crescent",
+    "First Quarter",
+    "Waxing Gibbous",
+    "Full Moon",
+    "Waning Gibbous",
+    "Last Quarter",
+    "Waning Crescent",
+)
+
+# Phase boundaries as a fraction of the synodic month. When n boundaries are
+# at or below the phase, its index in PHASE_NAMES is _BOUND_PHASES[n].
+_PHASE_BOUNDS = (0.033, 0.216, 0.283, 0.467, 0.533, 0.717, 0.783, 0.967)
+_BOUND_PHASES = (0, 1, 2, 3, 4, 5, 6, 7, 0)
+# The same boundaries as fixed-point cycle positions (rounded up, so
+# pos >= bound matches phase >= boundary)
+_PHASE_BOUNDS_FP = tuple(int(math.ceil(b * _FP_ONE)) for b in _PHASE_BOUNDS)
+
+# Emoji for each phase name (see MoonCalculator.get_phase_emoji)
+_PHASE_EMOJIS = {
+    "New Moon": "🌑",
+    "Waxing Crescent": "🌒",
+    "First Quarter": "🌓",
+    "Waxing Gibbous": "🌔",
+    "Full Moon": "🌕",
+    "Waning Gibbous": "🌖",
+    "Last Quarter": "🌗",
+    "Waning Crescent": "🌘",
+}
+
 class MoonCalculator:
+    # Fixed attribute set (CPython: no per-instance dict; MicroPython ignores it)
+    __slots__ = ('latitude', 'longitude', 'timezone_offset', '_moon_at')
+    
     def __init__(self, latitude, longitude, timezone_offset):
         self.latitude = latitude
         self.longitude = longitude
         self.timezone_offset = timezone_offset  # Hours from UTC
+        
+        # All the work is done by the specialised function from compile()
+        self._moon_at = MoonCalculator.compile(latitude, longitude, timezone_offset)
     
     def calculate_moon_phase(self, timestamp=None):
         """
         Calculate current moon phase using astronomical algorithms
         Returns: dict with phase information
         """
-        if timestamp is None:
-            timestamp = time.time()
-        
-        # Convert to Julian Date
-        jd = self._timestamp_to_julian(timestamp)
-        
-        # Calculate moon age in days since new moon
-        age_days = self._calculate_moon_age(jd)
-        
-        # Calculate illumination percentage
-        illumination = self._calculate_illumination(age_days)
-        
-        # Determine phase name
-        phase_name = self._get_phase_name(age_days)
-        
-        # Calculate moonrise and moonset times
-        moonrise, moonset = self._calculate_rise_set(jd)
-        
-        return {
-            'phase_name': phase_name,
-            'illumination': round(illumination, 2),
-            'age_days': round(age_days, 2),
-            'moonrise': moonrise,
-            'moonset': moonset,
-            'timestamp': timestamp
-        }
-    
-    def _timestamp_to_julian(self, timestamp):
-        """Convert Unix timestamp to Julian Date"""
-        # Unix epoch (1970-01-01) is JD 2440587.5
-        return (timestamp / 86400.0) + 2440587.5
-    
-    def _calculate_moon_age(self, jd):
-        """
-        Calculate moon's age in days since last new moon
-        Uses a simplified formula accurate to about 1 day
-        """
-        # Known new moon: January 6, 2000, 18:14 UTC (JD 2451550.26)
-        known_new_moon_jd = 2451550.26
-        
-        # Synodic month (new moon to new moon) = 29.53058867 days
-        synodic_month = 29.53058867
-        
-        # Calculate days since known new moon
-        days_since_known = jd - known_new_moon_jd
-        
-        # Calculate age within current cycle
-        age = days_since_known % synodic_month
-        
-        return age
-    
-    def _calculate_illumination(self, age_days):
-        """
-        Calculate moon illumination percentage based on age
-        0% = New Moon, 100% = Full Moon
-        """
-        synodic_month = 29.53058867
-        
-        # Phase angle (0 to 2*pi)
-        phase_angle = (age_days / synodic_month) * 2 * math.pi
-        
-        # Illumination formula: (1 - cos(angle)) / 2
-        illumination = (1 - math.cos(phase_angle)) / 2 * 100
-        
-        return illumination
-    
-    def _get_phase_name(self, age_days):
-        """
-        Determine moon phase name based on age in days
-        """
-        synodic_month = 29.53058867
-        
-        # Normalize to 0-1 range
-        phase = age_days / synodic_month
-        
-        # Define phase boundaries
-        if phase < 0.033 or phase > 0.967:
-            return "New Moon"
-        elif 0.033 <= phase < 0.216:
-            return "Waxing Crescent"
-        elif 0.216 <= phase < 0.283:
-            return "First Quarter"
-        elif 0.283 <= phase < 0.467:
-            return "Waxing Gibbous"
-        elif 0.467 <= phase < 0.533:
-            return "Full Moon"
-        elif 0.533 <= phase < 0.717:
-            return "Waning Gibbous"
-        elif 0.717 <= phase < 0.783:
-            return "Last Quarter"
-        else:  # 0.783 <= phase < 0.967
-            return "Waning Crescent"
-    
-    def _calculate_rise_set(self, jd):
+        return self._moon_at(timestamp)
+
+    @staticmethod
+    def compile(latitude, longitude, timezone_offset):
         """
-        Calculate moonrise and moonset times (simplified approximation)
-        Returns times in HH:MM format (local time)
+        Build a moon_at(timestamp=None) function that returns the moon phase
+        dict (see calculate_moon_phase) for this location, with every constant
+        bound as a default argument (fast local lookups instead of module
+        globals and self attributes on each call)
         """
-        # This is a very simplified calculation
-        # For production, consider using a proper ephemeris library
-        
-        age_days = self._calculate_moon_age(jd)
-        synodic_month = 29.53058867
-        
-        # Moon rises approximately 50 minutes later each day
-        # At new moon, rises/sets with sun (~6am/6pm)
-        # At full moon, rises at sunset and sets at sunrise
-        
-        # Base times (in hours, 24h format)
-        base_rise = 6.0  # 6 AM for new moon
-        base_set = 18.0  # 6 PM for new moon
-        
-        # Shift based on moon age (50 minutes per day = 0.833 hours)
-        time_shift = (age_days * 50) / 60  # Convert minutes to hours
-        
-        moonrise_hour = (base_rise + time_shift) % 24
-        moonset_hour = (base_set + time_shift) % 24
-        
-        # Apply timezone offset
-        moonrise_hour = (moonrise_hour + self.timezone_offset) % 24
-        moonset_hour = (moonset_hour + self.timezone_offset) % 24
-        
-        # Format as HH:MM
-        moonrise = self._format_time(moonrise_hour)
-        moonset = self._format_time(moonset_hour)
-        
-        return moonrise, moonset
-    
-    def _format_time(self, hour_decimal):
-        """Convert decimal hours to HH:MM format"""
-        hours = int(hour_decimal)
-        minutes = int((hour_decimal - hours) * 60)
-        return f"{hours:02d}:{minutes:02d}"
+        # Moonrise/moonset are a very simplified approximation (for production,
+        # consider using a proper ephemeris library): at new moon the moon
+        # rises/sets with the sun (~6am/6pm UTC, shifted here to local time
+        # in whole minutes since midnight), then about 50 minutes later for
+        # each day of its age. At full moon it rises at sunset.
+        tz_minutes = int(timezone_offset * 60)
+        
+        # [minute bucket, result] of the last call. Nothing on screen changes
+        # within a minute, so the result is reused.
+        cache = [None, None]
+
+        def moon_at(timestamp=None, _now=time.time, _elong=_elongation,
+                    _illum=_illumination_fp, _fp=_FP_PER_DEGREE,
+                    _dpd=DAYS_PER_DEGREE,
+                    _bounds=_PHASE_BOUNDS_FP, _bphases=_BOUND_PHASES,
+                    _names=PHASE_NAMES, _fmt=_format_hhmm, _cache=cache,
+                    _rise=(6 * 60 + tz_minutes) % 1440,
+                    _set=(18 * 60 + tz_minutes) % 1440):
+            if timestamp is None:
+                timestamp = _now()
+
+            bucket = int(timestamp // 60)
+            if _cache[0] == bucket:
+                return _cache[1]
+
+            # Moon-sun elongation (0 = new moon, 180 = full moon), as the
+            # moon age in days and the fixed-point position in the cycle
+            elongation = _elong(timestamp)
+            age_days = elongation * _dpd
+            pos = int(elongation * _fp)
+
+            # Phase: count the boundaries at or below pos
+            i = 0
+            while i < 8 and pos >= _bounds[i]:
+                i += 1
+            phase_index = _bphases[i]
+
+            # Rise/set shift based on moon age (50 minutes per day)
+            shift = int(age_days * 50)
+            result = {
+                'phase_name': _names[phase_index],
+                'phase_index': phase_index,
+                # (1 - cos(angle)) / 2 in units of 0.0001%, rounded to 0.01%
+                # in integers and only made a float at the end
+                'illumination': ((_illum(pos) + 50) // 100) / 100,
+                'age_days': round(age_days, 2),
+                'moonrise': _fmt((_rise + shift) % 1440),
+                'moonset': _fmt((_set + shift) % 1440),
+                'timestamp': timestamp
+            }
+            _cache[0] = bucket
+            _cache[1] = result
+            return result
+
+        return moon_at
     
     def get_phase_emoji(self, phase_name):
         """
         Get emoji representation of moon phase
         Useful for simple displays
         """
-        phase_emojis = {
-            "New Moon": "🌑",
-            "Waxing Crescent": "🌒",
-            "First Quarter": "🌓",
-            "Waxing Gibbous": "🌔",
-            "Full Moon": "🌕",
-            "Waning Gibbous": "🌖",
-            "Last Quarter": "🌗",
-            "Waning Crescent": "🌘"
-        }
-        return phase_emojis.get(phase_name, "🌙")
+        return _PHASE_EMOJIS.get(phase_name, "🌙")
     
     def compare_with_api(self, local_data, api_data):
         """
         Compare local calculation with API data
+        Fields the API didn't return (None) are skipped: their diff and
+        match entries are None instead of a bogus mismatch.
         Returns: dict with comparison results
         """
         if not api_data:
             return None
         
-        illumination_diff = abs(local_data['illumination'] - api_data['illumination'])
-        age_diff = abs(local_data['age_days'] - api_data['age_days'])
-        
         comparison = {
-            'illumination_match': illumination_diff < 5.0,  # Within 5%
-            'illumination_diff': round(illumination_diff, 2),
-            'age_match': age_diff < 0.5,  # Within 12 hours
-            'age_diff': round(age_diff, 2),
-            'phase_name_match': local_data['phase_name'] == api_data['phase_name']
+            'illumination_match': None,
+            'illumination_diff': None,
+            'age_match': None,
+            'age_diff': None,
+            'phase_name_match': None,
         }
         
+        api_illumination = api_data.get('illumination')
+        if api_illumination is not None:
+            illumination_diff = abs(local_data['illumination'] - api_illumination)
+            comparison['illumination_match'] = illumination_diff < 5.0  # Within 5%
+            comparison['illumination_diff'] = round(illumination_diff, 2)
+        
+        api_age = api_data.get('age_days')
+        if api_age is not None:
+            age_diff = abs(local_data['age_days'] - api_age)
+            comparison['age_match'] = age_diff < 0.5  # Within 12 hours
+            comparison['age_diff'] = round(age_diff, 2)
+        
+        if api_data.get('phase_name') is not None:
+            comparison['phase_name_match'] = local_data['phase_name'] == api_data['phase_name']
+        
         return comparison
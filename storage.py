@@ -2,78 +2,137 @@
 Storage Manager - Handles persistent data on flash storage
 Stores last sync times, time offsets, and other state data
 """
-import json
 import os
+import struct
 
-STORAGE_FILE = "moon_tracker_data.json"
+STORAGE_FILE = "moon_tracker_data.bin"
+
+# Everything is stored as one fixed 16-byte record, in this field order:
+# unsigned timestamps (good until 2106) and a signed time offset
+_FIELDS = ('last_ntp_sync', 'last_api_sync', 'time_offset', 'boot_time')
+_RECORD = '<IIiI'
+_RECORD_SIZE = struct.calcsize(_RECORD)
+
+# Valid range (lo <= value < hi) of each field in _FIELDS. MicroPython's
+# struct.pack silently truncates values that don't fit (a negative
+# timestamp would be stored as ~4.29e9), so save() checks them itself.
+_LIMITS = ((0, 1 << 32), (0, 1 << 32), (-(1 << 31), 1 << 31), (0, 1 << 32))
 
 class Storage:
+    # One attribute per record field (no per-instance dict)
+    __slots__ = _FIELDS + ('_dirty',)
+    
     def __init__(self):
-        self.data = self._load()
+        self._load()
+        # True when fields have changes that are not on flash yet (see flush)
+        self._dirty = False
+    
+    def _set_defaults(self):
+        """Set all fields to 0"""
+        self.last_ntp_sync = 0
+        self.last_api_sync = 0
+        self.time_offset = 0
+        self.boot_time = 0
     
     def _load(self):
-        """Load data from flash storage"""
+        """Load fields from flash storage"""
         try:
-            with open(STORAGE_FILE, 'r') as f:
-                return json.load(f)
-        except (OSError, ValueError):
-            # File doesn't exist or is corrupted, return defaults
-            return {
-                'last_ntp_sync': 0,
-                'last_api_sync': 0,
-                'time_offset': 0,
-                'boot_time': 0,
-            }
+            with open(STORAGE_FILE, 'rb') as f:
+                record = f.read(_RECORD_SIZE + 1)
+        except OSError:
+            # File doesn't exist, use defaults
+            self._set_defaults()
+            return
+        
+        if len(record) != _RECORD_SIZE:
+            # Truncated or not ours, use defaults
+            self._set_defaults()
+            return
+        (self.last_ntp_sync, self.last_api_sync,
+         self.time_offset, self.boot_time) = struct.unpack(_RECORD, record)
     
     def save(self):
-        """Save data to flash storage"""
+        """Save fields to flash storage (temp file + rename so it is never half-written)"""
+        values = []
+        for name, (lo, hi) in zip(_FIELDS, _LIMITS):
+            value = getattr(self, name)
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = None
+            if value is None or not lo <= value < hi:
+                # Reset just this field so the rest still get saved
+                print(f"Storage: {name} value {getattr(self, name)!r} out of range, reset to 0")
+                value = 0
+                setattr(self, name, value)
+            values.append(value)
+        record = struct.pack(_RECORD, *values)
+        
+        tmp_path = STORAGE_FILE + ".tmp"
         try:
-            with open(STORAGE_FILE, 'w') as f:
-                json.dump(self.data, f)
+            with open(tmp_path, 'wb') as f:
+                f.write(record)
+            os.rename(tmp_path, STORAGE_FILE)
+            self._dirty = False
             return True
         except OSError as e:
             print(f"Error saving storage: {e}")
             return False
     
+    def flush(self):
+        """Save to flash if anything changed since the last save"""
+        if not self._dirty:
+            return True
+        return self.save()
+    
     def get(self, key, default=None):
-        """Get a value from storage"""
-        return self.data.get(key, default)
+        """Get a field by name (kept for older callers, prefer the getters)"""
+        if key in _FIELDS:
+            return getattr(self, key)
+        return default
     
     def set(self, key, value):
-        """Set a value in storage and save"""
-        self.data[key] = value
-        return self.save()
+        """
+        Set a field by name (written to flash by the next flush)
+        Only the fields in _FIELDS exist; other keys raise KeyError.
+        """
+        if key not in _FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+        self._dirty = True
+        return True
     
     def get_last_ntp_sync(self):
         """Get the timestamp of the last NTP sync"""
-        return self.data.get('last_ntp_sync', 0)
+        return self.last_ntp_sync
     
     def set_last_ntp_sync(self, timestamp):
         """Record NTP sync time"""
-        return self.set('last_ntp_sync', timestamp)
+        self.last_ntp_sync = timestamp
+        self._dirty = True
+        return True
     
     def get_last_api_sync(self):
         """Get the timestamp of the last API sync"""
-        return self.data.get('last_api_sync', 0)
+        return self.last_api_sync
     
     def set_last_api_sync(self, timestamp):
         """Record API sync time"""
-        return self.set('last_api_sync', timestamp)
+        self.last_api_sync = timestamp
+        self._dirty = True
+        return True
     
     def get_boot_time(self):
         """Get the boot timestamp for time tracking"""
-        return self.data.get('boot_time', 0)
+        return self.boot_time
     
     def set_boot_time(self, timestamp):
         """Record boot time for offline time calculation"""
-        return self.set('boot_time', timestamp)
+        self.boot_time = timestamp
+        self._dirty = True
+        return True
     
     def clear_all(self):
         """Clear all stored data"""
-        self.data = {
-            'last_ntp_sync': 0,
-            'last_api_sync': 0,
-            'time_offset': 0,
-            'boot_time': 0,
-        }
+        self._set_defaults()
         return self.save()
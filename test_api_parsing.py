@@ -0,0 +1,84 @@
+"""
+Test Script for the API response parsers
+Run this on your development machine (not on Pico) to check that the fast
+key-scanning parser (_parse_response_fast) gives the same result as a full
+json.loads decode for large responses.
+"""
+
+import io
+import json
+from contextlib import redirect_stdout
+
+from api_client import MoonAPIClient, FAST_PARSE_THRESHOLD
+
+# Padding so every body is above FAST_PARSE_THRESHOLD and takes the fast path
+PADDING = "x" * (FAST_PARSE_THRESHOLD + 500)
+
+PHASE = {"phase": "Waxing Crescent", "illumination": 23.4, "age": 4.36}
+
+# (description, raw body)
+TEST_BODIES = [
+    ("Nested and in-string decoy keys",
+     json.dumps({
+         "sun": {"phase": {"phase": "Decoy"}, "moonrise": "99:99"},
+         "note": '"phase": {"phase": "Fake"}, "zodiac": 1',
+         "list": [{"phase": "Decoy"}, "moonset", ["transit"]],
+         "phase": PHASE,
+         "moonrise": "09:38",
+         "moonset": "21:38",
+         "padding": PADDING,
+         "zodiac": {"sign": "Leo"},
+     })),
+    ("Escaped quotes and backslashes",
+     json.dumps({
+         "padding": PADDING,
+         "quote\"phase": {"phase": "Decoy"},
+         "phase": PHASE,
+         "transit": "15:30 \\ \"approx\" é",
+         "zodiac": {"sign": "Sco\"rpio\\"},
+     })),
+    ("Number value at the end of the object",
+     json.dumps({"phase": PHASE, "padding": PADDING, "distance": {"km": 384400},
+                 "last": -1.5e3})),
+    ("Literal value at the end of the object",
+     json.dumps({"phase": PHASE, "padding": PADDING, "moonset": "21:38",
+                 "flag": True})),
+    ("Indented with newlines and tabs",
+     json.dumps({"padding": PADDING, "phase": PHASE, "moonrise": "09:38",
+                 "angular_diameter": {"degrees": 0.52}, "none": None},
+                indent="\t")),
+]
+
+def test_fast_parse_matches_full_parse():
+    """Fast and full parsing must agree on large bodies"""
+    print("=" * 60)
+    print("Testing API Response Parsing (fast vs full)")
+    print("=" * 60)
+
+    client = MoonAPIClient("key", "host", 42.28, -83.74, mode='basic')
+
+    print()
+    for description, body in TEST_BODIES:
+        raw = body.encode()
+        assert len(raw) > FAST_PARSE_THRESHOLD, f"{description}: body too small"
+
+        expected = client._parse_response(json.loads(raw))
+
+        # The fast parser prints a message when it has to fall back to
+        # json.loads; it must handle all of these bodies on its own
+        out = io.StringIO()
+        with redirect_stdout(out):
+            fast = client._parse_response_fast(bytearray(raw))
+        assert "Fast parse failed" not in out.getvalue(), \
+            f"{description}: fell back to a full decode ({out.getvalue().strip()})"
+
+        assert fast == expected, f"{description}: {fast} != {expected}"
+        assert fast['phase_name'] == PHASE['phase'], f"{description}: matched a decoy key"
+        print(f"{description}: OK")
+
+    print("\n" + "=" * 60)
+    print("Parsing test complete!")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    test_fast_parse_matches_full_parse()
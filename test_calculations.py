@@ -6,101 +6,124 @@ Note: This won't work directly on MicroPython due to some library differences,
 but the core logic is the same. Use this for development validation.
 """
 
+import calendar
 import time
-import math
+
+from moon_calc import MoonCalculator, SYNODIC_MONTH
+
+# Published 2025 new and full moon instants (UTC, to the minute, from the
+# USNO / timeanddate.com phase tables) as (month, day, hour, minute)
+NEW_MOONS_2025 = (
+    (1, 29, 12, 36), (2, 28, 0, 45), (3, 29, 10, 58), (4, 27, 19, 31),
+    (5, 27, 3, 2), (6, 25, 10, 31), (7, 24, 19, 11), (8, 23, 6, 6),
+    (9, 21, 19, 54), (10, 21, 12, 25), (11, 20, 6, 47), (12, 20, 1, 43),
+)
+FULL_MOONS_2025 = (
+    (1, 13, 22, 27), (2, 12, 13, 53), (3, 14, 6, 55), (4, 13, 0, 22),
+    (5, 12, 16, 56), (6, 11, 7, 44), (7, 10, 20, 37), (8, 9, 7, 55),
+    (9, 7, 18, 9), (10, 7, 3, 48), (11, 5, 13, 19), (12, 4, 23, 14),
+)
+
+# Allowed error against the published instants
+AGE_TOLERANCE = 0.05  # days (about 70 minutes)
+ILLUMINATION_TOLERANCE = 0.5  # percent
 
 def test_moon_calculations():
-    """Test the moon calculation algorithms"""
+    """Test the on-device moon calculation (MoonCalculator) now and at known phases"""
     
     print("=" * 60)
     print("Testing Moon Phase Calculations")
     print("=" * 60)
     
-    # Current time
-    current_timestamp = time.time()
+    calc = MoonCalculator(0, 0, 0)
+    
+    # Current moon, as the device would show it
+    moon = calc.calculate_moon_phase(time.time())
+    print(f"\nMoon Age: {moon['age_days']:.2f} days")
+    print(f"Illumination: {moon['illumination']:.2f}%")
+    print(f"Phase Name: {moon['phase_name']}")
+    print(f"Visual: {calc.get_phase_emoji(moon['phase_name'])}")
+    print(f"Moonrise (approx, UTC): {moon['moonrise']}")
+    print(f"Moonset (approx, UTC): {moon['moonset']}")
     
-    # Test data from known moon phases (approximate)
+    # Test data from known moon phases (UTC)
     test_cases = [
-        # (timestamp, expected_phase, description)
-        (1735689600, "Waxing Crescent", "January 1, 2025 - Known Waxing Crescent"),
-        # Add more test cases as needed
+        # (time tuple, expected_phase, expected_illumination or None, description)
+        ((2025, 1, 1, 0, 0, 0), "Waxing Crescent", None, "January 1, 2025 - Known Waxing Crescent"),
+        ((2025, 1, 6, 23, 56, 0), "First Quarter", 50.0, "January 6, 2025 - First Quarter"),
+        ((2025, 1, 13, 22, 27, 0), "Full Moon", 100.0, "January 13, 2025 - Full Moon"),
+        ((2025, 1, 21, 20, 31, 0), "Last Quarter", 50.0, "January 21, 2025 - Last Quarter"),
+        ((2025, 1, 29, 12, 36, 0), "New Moon", 0.0, "January 29, 2025 - New Moon"),
     ]
     
-    # Julian date conversion
-    jd = (current_timestamp / 86400.0) + 2440587.5
-    print(f"\nCurrent Julian Date: {jd:.2f}")
-    
-    # Moon age calculation
-    known_new_moon_jd = 2451550.26
-    synodic_month = 29.53058867
-    days_since_known = jd - known_new_moon_jd
-    age = days_since_known % synodic_month
-    
-    print(f"Moon Age: {age:.2f} days")
-    
-    # Illumination
-    phase_angle = (age / synodic_month) * 2 * math.pi
-    illumination = (1 - math.cos(phase_angle)) / 2 * 100
-    
-    print(f"Illumination: {illumination:.2f}%")
-    
-    # Phase name
-    phase = age / synodic_month
-    
-    if phase < 0.033 or phase > 0.967:
-        phase_name = "New Moon"
-    elif 0.033 <= phase < 0.216:
-        phase_name = "Waxing Crescent"
-    elif 0.216 <= phase < 0.283:
-        phase_name = "First Quarter"
-    elif 0.283 <= phase < 0.467:
-        phase_name = "Waxing Gibbous"
-    elif 0.467 <= phase < 0.533:
-        phase_name = "Full Moon"
-    elif 0.533 <= phase < 0.717:
-        phase_name = "Waning Gibbous"
-    elif 0.717 <= phase < 0.783:
-        phase_name = "Last Quarter"
-    else:
-        phase_name = "Waning Crescent"
-    
-    print(f"Phase Name: {phase_name}")
-    
-    # Moon emoji
-    phase_emojis = {
-        "New Moon": "🌑",
-        "Waxing Crescent": "🌒",
-        "First Quarter": "🌓",
-        "Waxing Gibbous": "🌔",
-        "Full Moon": "🌕",
-        "Waning Gibbous": "🌖",
-        "Last Quarter": "🌗",
-        "Waning Crescent": "🌘"
-    }
-    
-    emoji = phase_emojis.get(phase_name, "🌙")
-    print(f"Visual: {emoji}")
-    
-    # Approximate rise/set times
-    base_rise = 6.0
-    base_set = 18.0
-    time_shift = (age * 50) / 60
-    
-    moonrise_hour = (base_rise + time_shift) % 24
-    moonset_hour = (base_set + time_shift) % 24
-    
-    def format_time(hour_decimal):
-        hours = int(hour_decimal)
-        minutes = int((hour_decimal - hours) * 60)
-        return f"{hours:02d}:{minutes:02d}"
-    
-    print(f"Moonrise (approx): {format_time(moonrise_hour)}")
-    print(f"Moonset (approx): {format_time(moonset_hour)}")
+    print()
+    for when, expected_phase, expected_illum, description in test_cases:
+        result = calc.calculate_moon_phase(calendar.timegm(when))
+        print(f"{description}: {result['phase_name']} ({result['illumination']:.2f}%)")
+        assert result['phase_name'] == expected_phase, \
+            f"{description}: expected {expected_phase}, got {result['phase_name']}"
+        if expected_illum is not None:
+            assert abs(result['illumination'] - expected_illum) <= ILLUMINATION_TOLERANCE, \
+                f"{description}: expected {expected_illum}%, got {result['illumination']}%"
     
     print("\n" + "=" * 60)
     print("Calculation test complete!")
     print("=" * 60)
 
+def validate_reference():
+    """
+    Check MoonCalculator against published new and full moon times
+    At each instant the phase name, moon age and illumination must match the
+    real moon (within AGE_TOLERANCE / ILLUMINATION_TOLERANCE), which catches
+    a wrong coefficient or a broken on-device shortcut.
+    """
+    print("=" * 60)
+    print("Reference Validation (2025 new and full moons)")
+    print("=" * 60)
+    
+    calc = MoonCalculator(0, 0, 0)
+    failures = []
+    worst_age = 0.0
+    worst_illum = 0.0
+    for instants, name, age, illumination in (
+            (NEW_MOONS_2025, "New Moon", 0.0, 0.0),
+            (FULL_MOONS_2025, "Full Moon", SYNODIC_MONTH / 2, 100.0)):
+        for month, day, hour, minute in instants:
+            ts = calendar.timegm((2025, month, day, hour, minute, 0))
+            result = calc.calculate_moon_phase(ts)
+            
+            # Ages just below a full cycle are the same moment as age 0
+            age_diff = abs(result['age_days'] - age)
+            age_diff = min(age_diff, SYNODIC_MONTH - age_diff)
+            illum_diff = abs(result['illumination'] - illumination)
+            worst_age = max(worst_age, age_diff)
+            worst_illum = max(worst_illum, illum_diff)
+            
+            if (result['phase_name'] != name or age_diff > AGE_TOLERANCE
+                    or illum_diff > ILLUMINATION_TOLERANCE):
+                failures.append(f"2025-{month:02d}-{day:02d} {hour:02d}:{minute:02d} "
+                                f"expected {name}, got {result['phase_name']} "
+                                f"(age {result['age_days']}, {result['illumination']}%)")
+    
+    print(f"\nSamples: {len(NEW_MOONS_2025) + len(FULL_MOONS_2025)}")
+    print(f"Max age difference: {worst_age:.3f} days")
+    print(f"Max illumination difference: {worst_illum:.3f}%")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    assert not failures, f"{len(failures)} reference moon phases did not match"
+    print("All reference phases match!")
+
+# (minute, formatted date/time) from the last simulate_display_output call
+_last_fmt = (None, None)
+
+def _format_now():
+    """Current local time as MM/DD/YYYY HH:MM, formatted at most once a minute"""
+    global _last_fmt
+    minute = int(time.time() // 60)
+    if _last_fmt[0] != minute:
+        _last_fmt = (minute, time.strftime('%m/%d/%Y %H:%M'))
+    return _last_fmt[1]
+
 def simulate_display_output():
     """Simulate what will appear on the e-Paper display"""
     print("\n" + "=" * 60)
@@ -108,7 +131,7 @@ def simulate_display_output():
     print("=" * 60)
     print()
     print("  Ann Arbor, MI")
-    print(f"  {time.strftime('%m/%d/%Y %H:%M')}")
+    print(f"  {_format_now()}")
     print()
     print(" " * 20 + "🌙")
     print(" " * 15 + "[MOON PHASE]")
@@ -122,6 +145,8 @@ def simulate_display_output():
 if __name__ == "__main__":
     test_moon_calculations()
     print()
+    validate_reference()
+    print()
     simulate_display_output()
     
     print("\n💡 Tip: Compare these results with:")
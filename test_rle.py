@@ -0,0 +1,91 @@
+"""
+Test Script for the moon bitmap run-length encoding
+Run this on your development machine (not on Pico) to check that
+extract_moon_bitmaps.rle_encode and lunar_graphics.decode_rle round-trip.
+
+The decoder on the Pico is a viper function that writes through a raw
+pointer with no bounds checks, so a decoded bitmap must come out exactly
+the size it went in: any mismatch would corrupt the heap on the device.
+"""
+
+import random
+
+from extract_moon_bitmaps import rle_encode
+from lunar_graphics import decode_rle
+
+BITMAP_WIDTH = 155
+BITMAP_HEIGHT = 152
+BITMAP_STRIDE = 20  # Bytes per row (155 pixels rounded up to whole bytes)
+
+# Bytes after the decoded data that must never be written
+GUARD = b'\xa5\x5a\xa5\x5a'
+
+def _no_runs(length):
+    """length bytes with no value repeated back to back (all literals)"""
+    return bytes((i * 7 + i // 256) % 256 for i in range(length))
+
+def _moon_bitmap():
+    """
+    A full 155x152 MONO_HLSB bitmap (3040 bytes): a waxing crescent, with
+    long runs outside the disc and in its middle, and a noisy band along
+    the terminator so the encoder also emits literal blocks
+    """
+    rng = random.Random(1)
+    data = bytearray(BITMAP_STRIDE * BITMAP_HEIGHT)
+    cx, cy, r = 77, 76, 70
+    for y in range(BITMAP_HEIGHT):
+        for x in range(BITMAP_WIDTH):
+            dx, dy = x - cx, y - cy
+            lit = dx * dx + dy * dy <= r * r and (dx + 30) ** 2 + dy * dy > r * r
+            if abs(dx + 20) < 6:
+                lit = rng.random() < 0.5
+            if lit:
+                data[y * BITMAP_STRIDE + x // 8] |= 0x80 >> (x % 8)
+    return bytes(data)
+
+# (description, data)
+TEST_CASES = [
+    ("Empty", b""),
+    ("Run of 2 (stays literal)", b"\x00\x00"),
+    ("Run of 3 (shortest run)", b"\x11" * 3),
+    ("Run of 130 (longest run)", b"\x22" * 130),
+    ("Run of 131 (run + 1 literal)", b"\x33" * 131),
+    ("Run of 261 (two full runs + 1)", b"\x44" * 261),
+    ("Literal block of 128", _no_runs(128)),
+    ("Literal block of 129", _no_runs(129)),
+    ("Literal block of 300", _no_runs(300)),
+    ("Literals around runs", _no_runs(140) + b"\xff" * 131 + _no_runs(5) + b"\x00" * 3),
+    ("Full 155x152 bitmap", _moon_bitmap()),
+]
+
+def test_rle_round_trip():
+    """Encode then decode must give back the same bytes, and no more"""
+    print("=" * 60)
+    print("Testing Bitmap RLE Round Trip")
+    print("=" * 60)
+
+    assert len(TEST_CASES[-1][1]) == BITMAP_STRIDE * BITMAP_HEIGHT == 3040
+
+    print()
+    for description, data in TEST_CASES:
+        encoded = rle_encode(data)
+
+        dst = bytearray(len(data)) + bytearray(GUARD)
+        decode_rle(encoded, dst)
+
+        assert len(dst) == len(data) + len(GUARD), f"{description}: decoder grew the buffer"
+        assert dst[len(data):] == GUARD, f"{description}: decoder wrote past the end"
+        assert dst[:len(data)] == data, f"{description}: decoded bytes differ"
+        print(f"{description}: {len(data)} -> {len(encoded)} bytes OK")
+
+    # Spot-check the control bytes at the run/literal limits
+    assert rle_encode(b"\x22" * 130) == b"\xff\x22"
+    assert rle_encode(b"\x33" * 131) == b"\xff\x33\x00\x33"
+    assert rle_encode(_no_runs(129))[0] == 127 and rle_encode(_no_runs(129))[129] == 0
+
+    print("\n" + "=" * 60)
+    print("RLE test complete!")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    test_rle_round_trip()
@@ -2,17 +2,27 @@
 WiFi Manager - Handles WiFi connection and NTP time synchronization
 """
 import network
+import socket
+import struct
 import time
 import ntptime
 from machine import RTC
 
+# Seconds between the NTP epoch (1900) and the MicroPython epoch
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+
 class WiFiManager:
-    def __init__(self, ssid, password, timeout=10):
+    def __init__(self, ssid, password, timeout=10, debug=False):
         self.ssid = ssid
         self.password = password
         self.timeout = timeout
         self.wlan = network.WLAN(network.STA_IF)
         self.rtc = RTC()
+        # Whether wlan.status('rssi') works on this firmware, found out on
+        # the first get_rssi() while connected (None = not known yet)
+        self._rssi_supported = None
+        # Print the synced date and time (an extra time tuple per sync)
+        self.debug = debug
         
     def connect(self):
         """Connect to WiFi network"""
@@ -24,14 +34,19 @@ class WiFiManager:
         self.wlan.active(True)
         self.wlan.connect(self.ssid, self.password)
         
-        # Wait for connection
-        start_time = time.time()
+        # Wait for connection, checking every 100ms so we carry on as soon
+        # as it is up (a dot is printed every 500ms as before)
+        start = time.ticks_ms()
+        timeout_ms = self.timeout * 1000
+        polls = 0
         while not self.wlan.isconnected():
-            if time.time() - start_time > self.timeout:
+            if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
                 print("WiFi connection timeout")
                 return False
-            time.sleep(0.5)
-            print(".", end="")
+            time.sleep_ms(100)
+            polls += 1
+            if polls % 5 == 0:
+                print(".", end="")
         
         print(f"\nConnected! IP: {self.wlan.ifconfig()[0]}")
         return True
@@ -47,15 +62,18 @@ class WiFiManager:
         """Check if WiFi is connected"""
         return self.wlan.isconnected()
     
-    def sync_time_ntp(self, retries=3):
+    def sync_time_ntp(self, retries=3, max_wait=20):
         """
         Synchronize time with NTP server
+        Waits 2s, 4s, 8s, then 10s between attempts (plus up to 0.5s of jitter
+        so devices don't retry in lockstep), for at most max_wait seconds overall.
         Returns: timestamp if successful, None if failed
         """
         if not self.is_connected():
             print("Cannot sync NTP: not connected to WiFi")
             return None
         
+        deadline = time.ticks_add(time.ticks_ms(), max_wait * 1000)
         for attempt in range(retries):
             try:
                 print(f"Syncing time with NTP (attempt {attempt + 1}/{retries})...")
@@ -63,25 +81,99 @@ class WiFiManager:
                 
                 # Get current time from RTC
                 current_time = time.time()
-                print(f"NTP sync successful! Current time: {time.localtime(current_time)}")
+                self._report_sync(current_time)
                 return current_time
                 
             except Exception as e:
                 print(f"NTP sync failed: {e}")
                 if attempt < retries - 1:
-                    time.sleep(2)
+                    delay_ms = min(2 ** (attempt + 1), 10) * 1000 + (time.ticks_ms() & 0x1FF)
+                    if time.ticks_diff(deadline, time.ticks_ms()) < delay_ms:
+                        print("NTP sync giving up (out of time)")
+                        break
+                    time.sleep_ms(delay_ms)
         
         return None
     
+    def start_ntp_request(self):
+        """
+        Send an NTP query without waiting for the reply, so other network
+        requests can run while it is in flight (see finish_ntp_request)
+        Returns: (UDP socket, time.ticks_ms() when sent), or None if the
+        query could not be sent
+        """
+        if not self.is_connected():
+            return None
+        
+        sock = None
+        try:
+            addr = socket.getaddrinfo(ntptime.host, 123)[0][-1]
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            query = bytearray(48)
+            query[0] = 0x1B  # NTP version 3, client mode
+            sock.sendto(query, addr)
+            return sock, time.ticks_ms()
+        except Exception as e:
+            print(f"NTP request failed: {e}")
+            if sock:
+                sock.close()
+            return None
+    
+    def finish_ntp_request(self, request, timeout=1):
+        """
+        Read the reply to start_ntp_request() and set the RTC
+        The reply may have waited in the socket buffer while other requests
+        ran, so the time since the query was sent is added to it.
+        Falls back to a normal sync_time_ntp() if there is no usable reply.
+        Returns: timestamp if successful, None if failed
+        """
+        if request is None:
+            return self.sync_time_ntp()
+        
+        sock, sent_ms = request
+        try:
+            sock.settimeout(timeout)
+            msg = sock.recv(48)
+            seconds = struct.unpack("!I", msg[40:44])[0]
+            # The server stamped the reply (about) when the query arrived
+            elapsed_ms = time.ticks_diff(time.ticks_ms(), sent_ms)
+            seconds += (elapsed_ms + 500) // 1000
+            tm = time.gmtime(seconds - NTP_DELTA)
+            self.rtc.datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+            
+            current_time = time.time()
+            self._report_sync(current_time)
+            return current_time
+        except Exception as e:
+            print(f"NTP reply failed: {e}")
+            return self.sync_time_ntp()
+        finally:
+            sock.close()
+    
+    def _report_sync(self, current_time):
+        """Announce a successful NTP sync"""
+        print("NTP sync successful!")
+        if self.debug:
+            print(f"Current time: {time.localtime(current_time)}")
+    
     def get_rssi(self):
         """Get WiFi signal strength (RSSI)"""
-        if self.is_connected():
-            # Note: RSSI method may not be available on all MicroPython versions
+        if not self.is_connected():
+            return None
+        
+        # Note: RSSI method may not be available on all MicroPython versions.
+        # Check once, so later calls don't pay for a raised exception.
+        if self._rssi_supported is None:
             try:
-                return self.wlan.status('rssi')
-            except:
-                return None
-        return None
+                rssi = self.wlan.status('rssi')
+                self._rssi_supported = True
+                return rssi
+            except (ValueError, TypeError, OSError):
+                self._rssi_supported = False
+        
+        if not self._rssi_supported:
+            return None
+        return self.wlan.status('rssi')
     
     def scan_networks(self):
         """Scan for available WiFi networks"""